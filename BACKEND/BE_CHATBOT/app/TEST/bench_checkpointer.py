@@ -0,0 +1,114 @@
+"""
+Checkpoint read/write latency and storage against conversation length.
+
+Simulates a thread whose `messages` channel grows by one human/AI pair per turn,
+with a few super-steps per turn, and times put / get_tuple for the plain
+MongoDBSaver and the CompactingMongoDBSaver. Runs on mongomock by default; pass
+--mongo-url to use a local MongoDB.
+
+    python TEST/bench_checkpointer.py --turns 200 --report-every 25
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langgraph.checkpoint.base import empty_checkpoint  # noqa: E402
+from langgraph.checkpoint.base.id import uuid6  # noqa: E402
+from langgraph.checkpoint.mongodb import MongoDBSaver  # noqa: E402
+
+from services.mongo_checkpoint import CompactingMongoDBSaver  # noqa: E402
+
+VOCABULARY = (
+    "mình cần một chiếc điện thoại chụp ảnh đẹp pin trâu giá dưới triệu dưới đây là một số lựa chọn "
+    "phù hợp với nhu cầu của bạn tại FPT Shop Samsung Galaxy iPhone Xiaomi OPPO RAM GB màn hình AMOLED "
+    "sạc nhanh W camera MP khuyến mãi trả góp bảo hành tháng"
+).split()
+STEPS_PER_TURN = 4
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) if rng.random() > 0.1 else str(rng.randint(1, 40000)) for _ in range(words))
+
+
+def make_client(mongo_url: str):
+    if mongo_url:
+        from pymongo import MongoClient
+        return MongoClient(mongo_url)
+    import mongomock
+    return mongomock.MongoClient()
+
+
+def make_saver(kind: str, client) -> MongoDBSaver:
+    db_name = f"bench_checkpoints_{kind}"
+    client.drop_database(db_name)
+    if kind == "plain":
+        return MongoDBSaver(client, db_name=db_name)
+    saver = CompactingMongoDBSaver(client, db_name=db_name)
+    saver.setup()
+    return saver
+
+
+def stored_bytes(saver: MongoDBSaver) -> int:
+    return sum(len(doc["checkpoint"]) for doc in saver.checkpoint_collection.find({}, {"checkpoint": 1}))
+
+
+def run(kind: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    saver = make_saver(kind, make_client(args.mongo_url))
+    config = {"configurable": {"thread_id": "bench", "checkpoint_ns": ""}}
+    messages: List[Any] = []
+    put_times: List[float] = []
+    get_times: List[float] = []
+    rows = []
+    rng = random.Random(7)
+    for turn in range(1, args.turns + 1):
+        messages.append(HumanMessage(content=text(rng, 30), id=f"h{turn}"))
+        messages.append(AIMessage(content=text(rng, 180), id=f"a{turn}"))
+        for _ in range(STEPS_PER_TURN):
+            checkpoint = empty_checkpoint()
+            checkpoint["id"] = str(uuid6())
+            checkpoint["channel_values"] = {"messages": list(messages), "dialog_state": ["primary_assistant"]}
+            started = time.perf_counter()
+            config = saver.put(config, checkpoint, {"source": "loop", "step": turn, "writes": {}}, {})
+            put_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        saver.get_tuple({"configurable": {"thread_id": "bench", "checkpoint_ns": ""}})
+        get_times.append(time.perf_counter() - started)
+
+        if turn % args.report_every == 0:
+            rows.append({
+                "saver": kind,
+                "messages": len(messages),
+                "put_ms": statistics.mean(put_times) * 1000,
+                "get_ms": statistics.mean(get_times) * 1000,
+                "docs": saver.checkpoint_collection.count_documents({}),
+                "stored_kb": stored_bytes(saver) / 1024,
+            })
+            put_times.clear()
+            get_times.clear()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint latency and size against history length")
+    parser.add_argument("--mongo-url", default="", help="MongoDB URL (default: in-memory mongomock)")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--report-every", type=int, default=25)
+    args = parser.parse_args()
+
+    print(f"{'saver':<12}{'messages':>10}{'put ms':>10}{'get ms':>10}{'docs':>8}{'stored KB':>12}")
+    for kind in ("plain", "compacting"):
+        for row in run(kind, args):
+            print(f"{row['saver']:<12}{row['messages']:>10}{row['put_ms']:>10.2f}{row['get_ms']:>10.2f}"
+                  f"{row['docs']:>8}{row['stored_kb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Consumed-capacity benchmark for DynamoHistory write strategies.
+
+Replays synthetic turns against a local DynamoDB stand-in (DynamoDB Local,
+LocalStack, moto_server, ...) and reports requests and read/write capacity units
+for each strategy:
+
+- read_before_write: the previous writer (get_item on the id, then put_item)
+- conditional / transaction / batch: DynamoHistory.write_items modes
+
+A share of the turns is written twice, as a retried request would, so the
+idempotent strategies also pay for their duplicate handling.
+
+    python TEST/bench_dynamo_history.py --endpoint-url http://localhost:8000 --turns 10000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.dynamodb import DynamoHistory  # noqa: E402
+
+STRATEGIES = ["read_before_write", "conditional", "transaction", "batch"]
+CAPACITY_OPERATIONS = {"GetItem", "PutItem", "BatchWriteItem", "TransactWriteItems"}
+# Items per write_items call, as flushed by the HistoryWriter
+FLUSH_SIZE = 25
+
+
+class CapacityMeter:
+    """Ask for ConsumedCapacity on every write/read call and add it up from the responses."""
+
+    def __init__(self, client):
+        self.requests: Counter = Counter()
+        self.read_units = 0.0
+        self.write_units = 0.0
+        client.meta.events.register("provide-client-params.dynamodb.*", self._request_capacity)
+        client.meta.events.register("after-call.dynamodb.*", self._record)
+
+    def _request_capacity(self, params: Dict[str, Any], model, **kwargs):
+        if model.name in CAPACITY_OPERATIONS:
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    def _record(self, http_response, parsed: Dict[str, Any], model, **kwargs):
+        if model.name not in CAPACITY_OPERATIONS:
+            return
+        self.requests[model.name] += 1
+        consumed = parsed.get("ConsumedCapacity") or []
+        for entry in consumed if isinstance(consumed, list) else [consumed]:
+            if "ReadCapacityUnits" in entry or "WriteCapacityUnits" in entry:
+                self.read_units += entry.get("ReadCapacityUnits", 0.0)
+                self.write_units += entry.get("WriteCapacityUnits", 0.0)
+            elif model.name == "GetItem":
+                self.read_units += entry.get("CapacityUnits", 0.0)
+            else:
+                self.write_units += entry.get("CapacityUnits", 0.0)
+
+
+def synthetic_turns(manager: DynamoHistory, turns: int, seed: int) -> List[List[Dict[str, Any]]]:
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    batches = []
+    for i in range(turns):
+        start_time = start + datetime.timedelta(seconds=i * 7)
+        end_time = start_time + datetime.timedelta(milliseconds=rng.randint(400, 6000))
+        with_tool = rng.random() < 0.15
+        batches.append(manager.build_history_items(
+            conversation_id=f"bench-{i // 8}",
+            user_id=f"user-{rng.randint(1, 500)}",
+            user_input="x" * rng.randint(10, 200),
+            prompt_token=rng.randint(50, 3000),
+            completion_token=rng.randint(20, 800),
+            total_token=0,
+            start_time=start_time,
+            end_time=end_time,
+            response=None if with_tool else "y" * rng.randint(50, 1500),
+            language="vi",
+            tool_call_name="book_appointment" if with_tool else None,
+            tool_call_id=f"call-{i}" if with_tool else None,
+            tool_call_type="tool_call" if with_tool else None,
+        ))
+    return batches
+
+
+def create_table(manager: DynamoHistory) -> None:
+    client = manager.dynamodb.meta.client
+    client.create_table(
+        TableName=manager.table_name,
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    client.get_waiter("table_exists").wait(TableName=manager.table_name)
+    manager.check_table_exists(refresh=True)
+
+
+def read_before_write(manager: DynamoHistory, items: List[Dict[str, Any]]) -> None:
+    for item in items:
+        if not manager.check_id_exists(item["id"]):
+            manager.table.put_item(Item=item)
+
+
+def run_strategy(strategy: str, args: argparse.Namespace) -> Dict[str, Any]:
+    manager = DynamoHistory(
+        region_name=args.region,
+        aws_access_key_id="bench",
+        aws_secret_access_key="bench",
+        table_name=f"bench_history_{strategy}",
+        endpoint_url=args.endpoint_url,
+    )
+    create_table(manager)
+    turns = synthetic_turns(manager, args.turns, args.seed)
+    rng = random.Random(args.seed)
+    replayed = [turn for turn in turns if rng.random() < args.replay_fraction]
+
+    items = [item for turn in turns + replayed for item in turn]
+    meter = CapacityMeter(manager.dynamodb.meta.client)
+    started = time.perf_counter()
+    for i in range(0, len(items), FLUSH_SIZE):
+        chunk = items[i:i + FLUSH_SIZE]
+        if strategy == "read_before_write":
+            read_before_write(manager, chunk)
+        else:
+            manager.write_items(chunk, mode=strategy)
+    elapsed = time.perf_counter() - started
+
+    stored = manager.table.scan(Select="COUNT")["Count"]
+    if not args.keep_tables:
+        manager.table.delete()
+    return {
+        "strategy": strategy,
+        "items": len(items),
+        "stored": stored,
+        "requests": sum(meter.requests.values()),
+        "rcu": meter.read_units,
+        "wcu": meter.write_units,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare DynamoDB capacity used by history write strategies")
+    parser.add_argument("--endpoint-url", default="http://localhost:8000", help="Local DynamoDB endpoint")
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument("--turns", type=int, default=10000)
+    parser.add_argument("--replay-fraction", type=float, default=0.05,
+                        help="Share of turns written a second time (retries)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--strategies", nargs="+", default=STRATEGIES, choices=STRATEGIES)
+    parser.add_argument("--keep-tables", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'strategy':<18}{'items':>8}{'stored':>8}{'requests':>10}{'RCU':>10}{'WCU':>10}{'seconds':>9}")
+    for strategy in args.strategies:
+        r = run_strategy(strategy, args)
+        print(f"{r['strategy']:<18}{r['items']:>8}{r['stored']:>8}{r['requests']:>10}"
+              f"{r['rcu']:>10.1f}{r['wcu']:>10.1f}{r['seconds']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
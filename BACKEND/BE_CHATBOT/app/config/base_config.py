@@ -50,6 +50,8 @@ class DynamoDBConfig(BaseModel):
     aws_secret_access_key: str = Field(default_factory=lambda: (ensure_env_loaded(), from_env("AWS_SECRET_ACCESS_KEY")())[1])
     table_name: str = Field(default_factory=lambda: (ensure_env_loaded(), from_env("TABLE_NAME")())[1])
     region_name: str = Field(default_factory=lambda: (ensure_env_loaded(), from_env("AWS_REGION")())[1])
+    # Set to point at a local DynamoDB stand-in (e.g. http://localhost:8000)
+    endpoint_url: Optional[str] = Field(default_factory=lambda: (ensure_env_loaded(), from_env("DYNAMODB_ENDPOINT_URL", default=None)())[1])
 
 class SearchConfig(BaseModel):
     api_key: str = Field(default_factory=lambda: (ensure_env_loaded(), from_env("TAVILY_API_KEY")())[1])
@@ -4,18 +4,30 @@ from typing_extensions import AsyncGenerator
 import json
 from decimal import Decimal
 from schemas.chunk_message import ChunkMessage
-from typing import Dict
-from fastapi import APIRouter, HTTPException,Request,Depends
-from langchain_core.messages import HumanMessage, ToolMessage, AIMessage
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException,Request,Depends,Query
+from langchain_core.messages import HumanMessage, ToolMessage, AIMessageChunk
 from langdetect import detect
 from orchestrator.graph.main_graph import setup_agentic_graph
+from orchestrator.graph.snapshot import TurnState
 from orchestrator.graph.tools.support_nodes import format_message,extract_content_from_response
+from orchestrator.shop_graph.tools.get_score import start_catalog_refresher
 from sse_starlette.sse import EventSourceResponse
 from utils.logging.logger import get_logger
-from utils.token_counter import tiktoken_counter
+from utils.token_counter import TokenAccountant
 from config.base_config import APP_CONFIG
+from config.config_loader import CONFIG
+from utils.utils import get_value_from_dict
 from services.dynamodb import DynamoHistory
-from services.redis_caching import redis_caching
+from services.history_writer import HistoryWriter
+from services.chat_history_cache import (
+    CHAT_HISTORY_MAX_MESSAGES,
+    CHAT_HISTORY_PAGE_SIZE,
+    append_messages,
+    read_messages,
+    stream_id_key,
+)
+from services.chat_pubsub import RESYNC, chat_fanout
 from schemas.user_inputs import UserInputs,AuthenticatedUserInputs
 from .login_page import get_current_user
 from pydantic import EmailStr
@@ -29,6 +41,7 @@ AWS_SECRET_ACCESS_KEY = APP_CONFIG.dynamo_config.aws_secret_access_key
 TABLE_NAME = APP_CONFIG.dynamo_config.table_name
 AWS_SECRET_ACCESS_ID = APP_CONFIG.dynamo_config.aws_access_key_id
 REGION_NAME = APP_CONFIG.dynamo_config.region_name
+ENDPOINT_URL = APP_CONFIG.dynamo_config.endpoint_url
 
 def initialize_dynamo():
     global manager
@@ -48,7 +61,10 @@ def initialize_dynamo():
             aws_access_key_id=AWS_SECRET_ACCESS_ID,
             table_name=table_name,
             region_name=REGION_NAME,
+            endpoint_url=ENDPOINT_URL,
         )
+        # Cached for the life of the process; history writes no longer list tables
+        manager.check_table_exists()
         logger.info("DynamoHistory initialized successfully")
     except Exception as init_exc:
         logger.error("Error initializing DynamoHistory", exc_info=init_exc)
@@ -58,44 +74,134 @@ def initialize_dynamo():
 
 
 initialize_dynamo()
-redis_connect = redis_caching()
+# History records are written behind the response, in batches, by a background task
+history_writer = HistoryWriter(manager) if manager else None
 
 # Initialize graph with debug logging
 logger.info("Initializing global graph instance...")
 graph = setup_agentic_graph()
 logger.info("Global graph instance initialized")
+start_catalog_refresher()
+
+# "messages": forward LLM tokens as they are generated, "chunked": send the final answer in slices
+STREAM_MODE = get_value_from_dict("streaming_config.mode", CONFIG or {}, default="messages")()
+# Only tokens produced by the assistant nodes reach the client (tool-internal LLM calls are dropped)
+STREAMING_NODES = {"primary_assistant", "call_shop_agent", "call_it_agent", "call_appointment_agent"}
+
+
+def _token_text(message: AIMessageChunk) -> str:
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _discard_payload(message_id: str) -> str:
+    payload = ChunkMessage(response="", tools=None, prompt_token=0, completion_token=0, message_id=message_id, event="discard")
+    return f"{payload.model_dump_json()}\n\n"
+
+
+async def _astream_graph(graph_input, config: Dict, run: Dict) -> AsyncGenerator[str, None]:
+    """
+    Run the graph once, yielding SSE payloads for assistant tokens when STREAM_MODE is "messages".
+
+    Tokens are tagged with the id of the AI message they belong to. Text that turns
+    out not to be an answer is withdrawn with a "discard" event as soon as that is
+    known: a message that goes on to call a tool, or an attempt superseded by a new
+    one in the same node step (retry after a timeout, fallback model).
+    The last state values are left in run["values"], the streamed text per message
+    id in run["streamed"] and the withdrawn ids in run["discarded"].
+    """
+    run["values"] = {}
+    run["streamed"] = {}
+    run["discarded"] = set()
+    if STREAM_MODE != "messages":
+        async for values in graph.astream(graph_input, config, stream_mode="values"):
+            run["values"] = values
+        return
+
+    step_messages: Dict[tuple, str] = {}
+    async for mode, data in graph.astream(graph_input, config, stream_mode=["values", "messages"]):
+        if mode == "values":
+            run["values"] = data
+            continue
+        message, metadata = data
+        if metadata.get("langgraph_node") not in STREAMING_NODES or not isinstance(message, AIMessageChunk):
+            continue
+        message_id = message.id
+        if message.tool_call_chunks:
+            if message_id in run["streamed"] and message_id not in run["discarded"]:
+                run["discarded"].add(message_id)
+                yield _discard_payload(message_id)
+            continue
+        token = _token_text(message)
+        if not token:
+            continue
+        step = (metadata.get("langgraph_node"), metadata.get("langgraph_step"))
+        previous = step_messages.get(step)
+        if previous is not None and previous != message_id and previous not in run["discarded"]:
+            run["discarded"].add(previous)
+            yield _discard_payload(previous)
+        step_messages[step] = message_id
+        run["streamed"][message_id] = run["streamed"].get(message_id, "") + token
+        payload = ChunkMessage(response=token, tools=None, prompt_token=0, completion_token=0, message_id=message_id)
+        yield f"{payload.model_dump_json()}\n\n"
 
 async def stream_and_save_response(conversation_id: str, user_id: str, user_message: str, 
                                 final_response, final_tool_call, prompt_token: int, 
                                 completion_token: int, start_time, history_lang: str,
-                                tool_call_name, tool_call_args, tool_call_id, tool_call_type):
-    """Helper function to stream response and save to database."""
+                                tool_call_name, tool_call_args, tool_call_id, tool_call_type,
+                                run: Optional[Dict] = None, final_message_id: Optional[str] = None):
+    """Helper function to stream response and save to database.
+
+    When exactly the final answer was already streamed token by token, only a
+    closing payload carrying the tool call and token counts is sent. Otherwise
+    (nothing streamed, a partial or superseded attempt, a canned reply) every
+    streamed message still shown is discarded and the final answer is sent in full.
+    """
     content = extract_content_from_response(final_response)
     await save_message_to_redis(conversation_id, "ai", content)
-    
-    chunk_size = 15
-    for i in range(0, len(content), chunk_size):
-        chunk = content[i:i+chunk_size]
-        print(chunk, end="|")
+
+    streamed = (run or {}).get("streamed") or {}
+    discarded = (run or {}).get("discarded") or set()
+    answer_streamed = bool(content) and final_message_id not in discarded and streamed.get(final_message_id) == content
+    for message_id in streamed:
+        if message_id not in discarded and not (answer_streamed and message_id == final_message_id):
+            yield _discard_payload(message_id)
+
+    if answer_streamed:
         payload = ChunkMessage(
-            response=chunk,
+            response="",
             tools=[final_tool_call] if final_tool_call else None,
             prompt_token=prompt_token,
-            completion_token=completion_token
+            completion_token=completion_token,
+            message_id=final_message_id
         )
         yield f"{payload.model_dump_json()}\n\n"
+    else:
+        chunk_size = 15
+        for i in range(0, len(content), chunk_size):
+            chunk = content[i:i+chunk_size]
+            payload = ChunkMessage(
+                response=chunk,
+                tools=[final_tool_call] if final_tool_call else None,
+                prompt_token=prompt_token,
+                completion_token=completion_token,
+                message_id=final_message_id
+            )
+            yield f"{payload.model_dump_json()}\n\n"
     
     # Log and save to database after streaming is complete
     end_time = datetime.datetime.now(datetime.timezone.utc)
     execution_time = (end_time - start_time).total_seconds()
     logger.info(f"Stream finished, execution_time={execution_time}s")
     
-    if manager:  # Always save if manager exists, regardless of final_response
+    if history_writer:  # Always save if manager exists, regardless of final_response
         try:
             decimal_execution_time = Decimal(str(execution_time)) if execution_time is not None else None
             response_content = extract_content_from_response(final_response) if final_response else None
             
-            manager.save_chat_history(
+            await history_writer.submit(
                 conversation_id=conversation_id,
                 user_id=user_id,
                 user_input=user_message,
@@ -112,112 +218,111 @@ async def stream_and_save_response(conversation_id: str, user_id: str, user_mess
                 tool_call_type=final_tool_call['type'] if final_tool_call else tool_call_type,
                 response=response_content
             )
-            logger.info("Chat history saved successfully")
+            logger.info("Chat history queued for saving")
         except Exception as save_exc:
-            logger.error("Error saving chat history to DynamoDB", exc_info=save_exc)
+            logger.error("Error queueing chat history for DynamoDB", exc_info=save_exc)
     else:
         logger.warning("DynamoDB manager not available; skipping save to history.")
 
 #_____________________SETUP CACHING______________________________
-async def publish_to_channel(channel: str, message: dict):
-    if not redis_connect:
-        logger.warning("Redis not available, skipping channel publish")
+async def save_messages_to_redis(conversation_id: str, messages: List[Tuple[str, str]]):
+    """Append several (role, message) pairs and publish them, in one round trip."""
+    if not conversation_id:
+        logger.warning("No conversation_id, skipping message save")
         return
     try:
-        message_json = json.dumps(message)
-        await asyncio.to_thread(redis_connect.publish, channel, message_json)
+        await append_messages(conversation_id, messages)
     except Exception as e:
-        logger.error(f"Error publishing to channel {channel}: {str(e)}")
+        logger.error(f"Error saving message to Redis: {str(e)}")
 
 async def save_message_to_redis(conversation_id: str, role: str, message: str):
-    if not conversation_id or not redis_connect:
-        logger.warning("Redis not available or no conversation_id, skipping message save")
-        return
-    
-    message_data = {"role": role, "content": message}
-    message_json = json.dumps(message_data)
-    try:
-        await asyncio.to_thread(redis_connect.rpush, f"chat:{conversation_id}", message_json)
-        await asyncio.to_thread(redis_connect.ltrim, f"chat:{conversation_id}", -100, -1)
-        await asyncio.to_thread(redis_connect.expire, f"chat:{conversation_id}", 86400)  
-        await publish_to_channel(f"chat:{conversation_id}", message_data)
-    except Exception as e:
-        logger.error(f"Error saving message to Redis: {str(e)}")
+    await save_messages_to_redis(conversation_id, [(role, message)])
 ##_______________________SETUP SSE____________________________________
-async def retrieve_events(request: Request, conversation_id: str) -> AsyncGenerator[str, None]:
-    pubsub = None
+def _is_stream_id(entry_id: str) -> bool:
     try:
-        if not redis_connect:
-            logger.error("Redis not available for SSE")
-            yield json.dumps({"error": "Chat history service unavailable"})
+        stream_id_key(entry_id)
+        return True
+    except ValueError:
+        return False
+
+def _sse_message(message: Dict) -> Dict:
+    return {"id": message["id"], "data": f"{json.dumps(message)}\n\n"}
+
+async def _read_history_after(conversation_id: str, after_id: Optional[str]) -> AsyncGenerator[Dict, None]:
+    """Every stream entry after `after_id`, page by page."""
+    cursor = after_id
+    while True:
+        page = await read_messages(conversation_id, after_id=cursor, limit=CHAT_HISTORY_PAGE_SIZE)
+        for message in page:
+            yield message
+        if len(page) < CHAT_HISTORY_PAGE_SIZE:
             return
-            
-        pubsub = redis_connect.pubsub()
-        await asyncio.to_thread(pubsub.subscribe, f"chat:{conversation_id}")
-        
-        # Send existing chat history first
-        try:
-            history = await asyncio.to_thread(redis_connect.lrange, f"chat:{conversation_id}", 0, -1)
-            for msg in history:
-                msg_str = msg.decode('utf-8') if isinstance(msg, bytes) else msg
+        cursor = page[-1]["id"]
+
+async def retrieve_events(request: Request, conversation_id: str, last_event_id: Optional[str] = None) -> AsyncGenerator[Dict, None]:
+    """
+    Replay the history after `last_event_id` (all of it on a first connect), then follow live messages.
+    Every event carries the stream id, so a reconnecting client only receives what it missed.
+    """
+    last_seen_id = last_event_id
+    last_seen = stream_id_key(last_event_id) if last_event_id else (0, 0)
+    try:
+        # Register before reading the history so no message published in between is lost
+        async with chat_fanout.subscribe(conversation_id) as queue:
+            replay = True
+            while not await request.is_disconnected():
+                if replay:
+                    # First connect, or the fan-out resubscribed and may have missed messages
+                    replay = False
+                    try:
+                        async for message in _read_history_after(conversation_id, last_seen_id):
+                            last_seen_id, last_seen = message["id"], stream_id_key(message["id"])
+                            yield _sse_message(message)
+                    except Exception as e:
+                        logger.error(f"Error retrieving chat history: {e}")
+                    continue
+
+                # Listen for new messages
                 try:
-                    message_data = json.loads(msg_str)
-                    yield f"{json.dumps(message_data)}\n\n"
-                except json.JSONDecodeError:
-                    logger.warning(f"Skipping invalid JSON in history: {msg_str}")
-        except Exception as e:
-            logger.error(f"Error retrieving chat history: {e}")
-        
-        # Listen for new messages
-        while not await request.is_disconnected():
-            try:
-                message = await asyncio.to_thread(pubsub.get_message, timeout=1.0, ignore_subscribe_messages=True)
-                if message and message["type"] == "message":
-                    data = message["data"]
-                    if isinstance(data, bytes):
-                        data = data.decode('utf-8')
-                    yield f"{data}\n\n"
-            except Exception as e:
-                logger.error(f"Error in SSE message loop: {e}")
-                break
-    
+                    data = await asyncio.wait_for(queue.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                if data is RESYNC:
+                    replay = True
+                    continue
+                message = json.loads(data)
+                entry_key = stream_id_key(message["id"])
+                if entry_key <= last_seen:
+                    # Already sent by a replay
+                    continue
+                last_seen_id, last_seen = message["id"], entry_key
+                yield _sse_message(message)
+
     except asyncio.CancelledError:
         logger.info(f"SSE connection for conversation {conversation_id} was cancelled")
     except Exception as e:
         logger.error(f"Error in SSE connection: {e}")
         yield f"{json.dumps({'error': str(e)})}\n\n"
-    finally:
-        if pubsub:
-            try:
-                await asyncio.to_thread(pubsub.unsubscribe, f"chat:{conversation_id}")
-                await asyncio.to_thread(pubsub.close)
-            except Exception as e:
-                logger.error(f"Error closing pubsub: {e}")
 
 @router.get("/{conversation_id}/subscribe")
-async def subscribe_to_stream(request: Request, conversation_id: str):
-    return EventSourceResponse(retrieve_events(request, conversation_id))
+async def subscribe_to_stream(request: Request, conversation_id: str, last_event_id: Optional[str] = None):
+    # Browsers send Last-Event-ID on automatic reconnects; other clients may pass it as a query parameter
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+    if last_event_id and not _is_stream_id(last_event_id):
+        raise HTTPException(status_code=400, detail=f"Invalid Last-Event-ID: {last_event_id}")
+    return EventSourceResponse(retrieve_events(request, conversation_id, last_event_id))
 
 @router.get("/{conversation_id}/messages")
-async def get_chat_history(conversation_id: str):
+async def get_chat_history(
+    conversation_id: str,
+    after_id: Optional[str] = None,
+    limit: int = Query(default=CHAT_HISTORY_MAX_MESSAGES, ge=1, le=CHAT_HISTORY_MAX_MESSAGES)
+):
+    """Messages after the `after_id` cursor, oldest first; pass the last returned id to get the next page."""
+    if after_id and not _is_stream_id(after_id):
+        raise HTTPException(status_code=400, detail=f"Invalid after_id: {after_id}")
     try:
-        if not redis_connect:
-            logger.warning("Redis not available, returning empty history")
-            return []
-            
-        exists = await asyncio.to_thread(redis_connect.exists, f"chat:{conversation_id}")
-        if exists:
-            history = await asyncio.to_thread(redis_connect.lrange, f"chat:{conversation_id}", 0, -1)
-            messages = []
-            for msg in history:
-                try:
-                    msg_str = msg.decode('utf-8') if isinstance(msg, bytes) else msg
-                    message_data = json.loads(msg_str)
-                    messages.append(message_data)
-                except json.JSONDecodeError:
-                    logger.warning(f"Skipping invalid JSON in history: {msg}")
-            return messages
-        return []
+        return await read_messages(conversation_id, after_id=after_id, limit=limit)
     except Exception as e:
         logger.error(f"Error retrieving chat history: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error retrieving chat history: {str(e)}")
@@ -237,10 +342,10 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
 
         # Log initial graph state
         logger.debug(f"Initial graph state for conversation {conversation_id}:")
-        initial_snapshot = graph.get_state(config)
-        if isinstance(initial_snapshot, tuple):
-            initial_snapshot = initial_snapshot[0]
-        logger.debug(f"Initial snapshot: {initial_snapshot}")
+        # One checkpoint read per turn start; the run's state is tracked in memory after that
+        turn = TurnState(graph, config)
+        snapshot = await turn.load()
+        logger.debug(f"Initial snapshot: {snapshot.values}")
         
         user_message = user_inputs.message
         await save_message_to_redis(conversation_id, "human", user_message) 
@@ -250,11 +355,11 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
         tool_call_type = None
         history_lang = detect(user_message) if user_message else None
         
-        initial_chat_history = initial_snapshot.get("messages", []) if hasattr(initial_snapshot, 'get') else []
-        initial_prompt_token = tiktoken_counter(initial_chat_history) if initial_chat_history else 0
+        initial_chat_history = turn.initial_messages
+        # Only remembers message ids; tokens are counted for the messages this turn appends
+        token_accountant = TokenAccountant(initial_chat_history)
         logger.debug(f"Initial chat history length: {len(initial_chat_history)}")
 
-        snapshot = graph.get_state(config)
         logger.debug(f"State before processing for {conversation_id}: {snapshot}")
         
         if snapshot and snapshot.next:
@@ -275,21 +380,24 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
                 
                 if user_message.strip().lower() == "y":
                     logger.debug("User confirmed tool call")
-                    result = graph.invoke(None, config)
+                    graph_input = None
                 else:
                     logger.debug("User rejected tool call")
                     tool_call_id = last_toolcall_message.tool_calls[0]["id"]
-                    result = graph.invoke(
-                        {
-                            "messages": [
-                                ToolMessage(
-                                    tool_call_id=tool_call_id,
-                                    content=f"API call denied by user. Reasoning: '{user_message}'. Continue assisting, accounting for the user's input.",
-                                )
-                            ]
-                        },
-                        config,
-                    )
+                    graph_input = {
+                        "messages": [
+                            ToolMessage(
+                                tool_call_id=tool_call_id,
+                                content=f"API call denied by user. Reasoning: '{user_message}'. Continue assisting, accounting for the user's input.",
+                            )
+                        ]
+                    }
+
+                run = {}
+                async for chunk in _astream_graph(graph_input, config, run):
+                    yield chunk
+                turn.track(run["values"])
+                result = turn.values
                 
                 logger.debug(f"Tool call result: {result}")
                 
@@ -315,6 +423,7 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
                 
                 # Get final response from processed messages
                 final_response = ""
+                final_message_id = None
                 for msg_data in reversed(all_messages):
                     content = msg_data["content"]
                     message = msg_data["message"]
@@ -327,25 +436,22 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
                         not content.startswith("The assistant is now")):
                         
                         final_response = content
+                        final_message_id = message.id
                         break
                 
                 final_tool_call = all_tool_calls[-1] if all_tool_calls else None
-                completion_token = tiktoken_counter([AIMessage(content=final_response)])
                 
-                snapshot = graph.get_state(config)
-                if isinstance(snapshot, tuple):
-                    snapshot = snapshot[0]
+                chat_history = turn.messages
+                prompt_token = token_accountant.prompt_tokens(chat_history)
+                completion_token = token_accountant.completion_tokens(final_response, chat_history)
                 
-                chat_history = snapshot.get("messages", []) if hasattr(snapshot, 'get') else []
-                total_prompt_token = tiktoken_counter(chat_history) if chat_history else 0
-                prompt_token = total_prompt_token - initial_prompt_token
-                
-                logger.debug(f"Final state after tool call processing: {snapshot}")
+                logger.debug(f"Final state after tool call processing: {turn.values}")
                 
                 async for chunk in stream_and_save_response(
                     conversation_id, user_id, user_message, final_response, 
                     final_tool_call, prompt_token, completion_token, start_time, 
-                    history_lang, tool_call_name, tool_call_args, tool_call_id, tool_call_type
+                    history_lang, tool_call_name, tool_call_args, tool_call_id, tool_call_type,
+                    run=run, final_message_id=final_message_id
                 ):
                     yield chunk
                 
@@ -365,34 +471,33 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
         }
         logger.debug(f"Initial state for new conversation: {initial_state}")
         
-        events = graph.stream(
-            initial_state,
-            config,
-            stream_mode="values"
-        )
+        run = {}
+        async for chunk in _astream_graph(initial_state, config, run):
+            yield chunk
 
-        for event in events:
-            if "messages" in event:
-                for message in event["messages"]:
-                    msg_content = format_message(message)
-                    msg_hash = hash(msg_content)
-                    if msg_hash not in processed_set:
-                        processed_set.add(msg_hash)
-                        all_messages.append({
-                            "content": msg_content,
-                            "message": message
-                        })
+        turn.track(run["values"])
+        event = turn.values
+        if "messages" in event:
+            for message in event["messages"]:
+                msg_content = format_message(message)
+                msg_hash = hash(msg_content)
+                if msg_hash not in processed_set:
+                    processed_set.add(msg_hash)
+                    all_messages.append({
+                        "content": msg_content,
+                        "message": message
+                    })
                         
-                        if hasattr(message, "tool_calls") and message.tool_calls:
-                            for tool_call in message.tool_calls:
-                                all_tool_calls.append({
-                                    "name": tool_call['name'],
-                                    "args": tool_call.get('args', {}),
-                                    "id": tool_call['id'],
-                                    "type": tool_call['type']
-                                })
-
-        snapshot = graph.get_state(config)
+                    if hasattr(message, "tool_calls") and message.tool_calls:
+                        for tool_call in message.tool_calls:
+                            all_tool_calls.append({
+                                "name": tool_call['name'],
+                                "args": tool_call.get('args', {}),
+                                "id": tool_call['id'],
+                                "type": tool_call['type']
+                            })
+
+        snapshot = await turn.final()
         logger.debug(f"State after processing for {conversation_id}: {snapshot}")
         
         if snapshot and snapshot.next:
@@ -406,19 +511,18 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
                         f"Vui lòng xác nhận yêu cầu: {tool_args}, nhấn 'y' để xác nhận hoặc 'n' để từ chối."
                     )
                     await save_message_to_redis(conversation_id, "ai", confirmation_message)
-                    for char in confirmation_message:
-                        print(char, end="|")
-                        payload = ChunkMessage(
-                            response=char,
-                            tools=None,
-                            prompt_token=0,
-                            completion_token=0
-                        )
-                        yield f"{payload.model_dump_json()}\n\n"
+                    payload = ChunkMessage(
+                        response=confirmation_message,
+                        tools=None,
+                        prompt_token=0,
+                        completion_token=0
+                    )
+                    yield f"{payload.model_dump_json()}\n\n"
                     return
 
         # Get final response
         final_response = ""
+        final_message_id = None
         for msg_data in reversed(all_messages):
             content = msg_data["content"]
             message = msg_data["message"]
@@ -431,24 +535,22 @@ async def stream_event(user_inputs: UserInputs, config: Dict, user_id:str,email:
                 not content.startswith("The assistant is now")):
                 
                 final_response = content
+                final_message_id = message.id
                 break
 
         final_tool_call = all_tool_calls[-1] if all_tool_calls else None
-        completion_token = tiktoken_counter([AIMessage(content=final_response)])
-
-        snapshot = graph.get_state(config)
-        if isinstance(snapshot, tuple):
-            snapshot = snapshot[0]
-        chat_history = snapshot.get("messages", []) if hasattr(snapshot, 'get') else []
-        total_prompt_token = tiktoken_counter(chat_history) if chat_history else 0
-        prompt_token = total_prompt_token - initial_prompt_token
+
+        chat_history = turn.messages
+        prompt_token = token_accountant.prompt_tokens(chat_history)
+        completion_token = token_accountant.completion_tokens(final_response, chat_history)
         
-        logger.debug(f"Final state after conversation: {snapshot}")
+        logger.debug(f"Final state after conversation: {turn.values}")
         
         async for chunk in stream_and_save_response(
             conversation_id, user_id, user_message, final_response, 
             final_tool_call, prompt_token, completion_token, start_time, 
-            history_lang, tool_call_name, tool_call_args, tool_call_id, tool_call_type
+            history_lang, tool_call_name, tool_call_args, tool_call_id, tool_call_type,
+            run=run, final_message_id=final_message_id
         ):
             yield chunk
                 
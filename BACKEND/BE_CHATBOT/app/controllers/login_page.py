@@ -11,12 +11,13 @@ from typing import List, Optional
 import jwt
 from datetime import datetime, timedelta, timezone
 import bcrypt
-from .login_schema import RegisterRequest, LoginRequest, AuthResponse, PasswordChangeRequest
+from .login_schema import RegisterRequest, LoginRequest, AuthResponse, PasswordChangeRequest, PreferenceUpdateRequest
 from utils.email import send_email
 import string
 from random import choices
 from sqlalchemy.orm import Session
 from models.database import CustomerInfo, get_db
+from services.preference_cohort import add_user_to_cohorts, invalidate_cohorts
 
 auth_config = APP_CONFIG.auth_config
 SECRET_KEY = auth_config.key
@@ -151,13 +152,7 @@ def register_new_user(
     if email and check_email_exists(email, db):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    if preference_brand is None:
-        preference_brand = []
-
-    prefs = {
-        "brand": preference_brand,
-        "price_range": [min_price, max_price] if min_price is not None and max_price is not None else []
-    }
+    prefs = build_preferences(preference_brand, min_price, max_price)
     preferences_json = json.dumps(prefs)
     user_id = f"USER_{generate_short_id()}"
     hashed_password = hash_password(password)
@@ -176,15 +171,44 @@ def register_new_user(
         
         db.add(new_user)
         db.commit()
-        
-        return {
-            "user_id": user_id,
-            "email": email
-        }
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
+    try:
+        add_user_to_cohorts(age, prefs)
+    except Exception as e:
+        print(f"Failed to update preference cohorts for {user_id}: {e}")
+
+    return {
+        "user_id": user_id,
+        "email": email
+    }
+
+def build_preferences(preference_brand: Optional[List[str]], min_price: Optional[str], max_price: Optional[str]) -> dict:
+    """Preference document stored in CustomerInfo.preferences"""
+    return {
+        "brand": preference_brand or [],
+        "price_range": [min_price, max_price] if min_price is not None and max_price is not None else []
+    }
+
+def set_user_preferences(user_id: str, prefs: Optional[dict], db: Session) -> Optional[dict]:
+    """Replace (or with None, remove) a user's preferences."""
+    user = db.query(CustomerInfo).filter(CustomerInfo.user_id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        user.preferences = json.dumps(prefs) if prefs is not None else None
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Preference update failed: {str(e)}")
+
+    # Cohort documents are unions, the old values cannot be taken out of them: rebuild from SQL
+    invalidate_cohorts(user.age)
+    return prefs
+
 def get_current_user(user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
     """Get current authenticated user details"""
     print(f"Getting current user for user_id: {user_id}")
@@ -313,6 +337,18 @@ async def change_password(request: PasswordChangeRequest, db: Session = Depends(
 
     return {"message": "Password updated successfully"}
 
+@auth.put("/preferences")
+async def update_preferences(request: PreferenceUpdateRequest, user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
+    """Replace the current user's preferences"""
+    prefs = build_preferences(request.preference_brand, request.min_price, request.max_price)
+    return {"user_id": user_id, "preferences": set_user_preferences(user_id, prefs, db)}
+
+@auth.delete("/preferences")
+async def delete_preferences(user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
+    """Remove the current user's preferences"""
+    set_user_preferences(user_id, None, db)
+    return {"message": "Preferences removed"}
+
 @auth.get("/protected")
 async def protected_route(current_user: dict = Depends(get_current_user)):
     """Example protected route"""
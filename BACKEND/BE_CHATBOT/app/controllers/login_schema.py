@@ -44,3 +44,8 @@ class PasswordChangeRequest(BaseModel):
     temp_password: str
     new_password: str
 
+
+class PreferenceUpdateRequest(BaseModel):
+    preference_brand: List[str] = []
+    min_price: str = None
+    max_price: str = None
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from typing import Any, Awaitable, Callable, Dict, Optional, cast
 
 from asgi_correlation_id import CorrelationIdMiddleware
@@ -10,6 +11,10 @@ import structlog
 
 from controllers import api_chat
 from controllers import login_page
+from services.chat_pubsub import chat_fanout
+from services.connection_manager import health_monitor, pool_metrics
+from orchestrator.graph.assistant_metrics import assistant_metrics
+from utils.concurrency import install_blocking_executor
 from utils.helpers import LoggingMiddleware
 from utils.logging.logger import get_logger, setup_logging
 from utils.tracing import extract_context_from_request, get_current_trace_ids, get_tracer
@@ -18,6 +23,24 @@ setup_logging(json_logs=True)
 logger = get_logger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync graph nodes, tools and checkpoint I/O run in this bounded pool instead of on the event loop
+    install_blocking_executor()
+    # Pings MongoDB and Redis in the background instead of before every call
+    health_monitor.start()
+    # One Redis pattern subscription per worker feeds every /subscribe stream
+    chat_fanout.start()
+    if api_chat.history_writer:
+        api_chat.history_writer.start()
+    yield
+    await chat_fanout.stop()
+    if api_chat.history_writer:
+        # Flush queued history before the worker exits
+        await api_chat.history_writer.stop()
+    health_monitor.stop()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Orchestrator Service",
@@ -26,7 +49,7 @@ app = FastAPI(
     docs_url=None,  # Disable /docs endpoint (we'll create a custom one)
     redoc_url=None,  # Disable /redoc endpoint (we'll create a custom one)
     openapi_url=r"/api/openapi.json",
-    # lifespan=lifespan
+    lifespan=lifespan
 )
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -183,6 +206,18 @@ async def root():
     }
 
 
+@app.get("/health/pools", tags=["health"])
+async def pools():
+    """Connection pool usage, checkout wait times and circuit state per backend"""
+    return pool_metrics()
+
+
+@app.get("/health/assistants", tags=["health"])
+async def assistants():
+    """Invocation outcomes, re-prompts (and the tokens they cost) and fallbacks per assistant node"""
+    return assistant_metrics.snapshot()
+
+
 app.include_router(api_chat.router, prefix="/v1/chat", tags=["Chat controller"])
 app.include_router(login_page.auth, prefix="/v1/auth", tags=["Login controller"])
 
@@ -0,0 +1,66 @@
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+from opentelemetry import metrics
+
+meter = metrics.get_meter(__name__)
+
+# Exported through whatever MeterProvider the deployment installs (no-op otherwise)
+invocation_counter = meter.create_counter(
+    "assistant.invocations", description="Assistant LLM invocations by outcome (ok, empty, timeout, error)"
+)
+reprompt_counter = meter.create_counter(
+    "assistant.reprompts", description="Times an empty answer was re-prompted with 'Respond with a real output.'"
+)
+wasted_token_counter = meter.create_counter(
+    "assistant.reprompt.tokens", unit="token", description="Tokens spent on answers discarded as empty"
+)
+fallback_counter = meter.create_counter(
+    "assistant.fallbacks", description="Turns handed to the fallback model, or to the canned reply when it failed too"
+)
+duration_histogram = meter.create_histogram(
+    "assistant.invocation.duration", unit="s", description="Latency of one assistant LLM invocation"
+)
+
+
+class AssistantMetrics:
+    """OpenTelemetry instruments plus in-process totals per assistant node (served on /health/assistants)."""
+
+    def __init__(self):
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def _add(self, agent: str, **values: float) -> None:
+        with self._lock:
+            self._counts[agent].update(values)
+
+    def record_invocation(self, agent: str, model: str, outcome: str, duration: float) -> None:
+        attributes = {"agent": agent, "model": model, "outcome": outcome}
+        invocation_counter.add(1, attributes)
+        duration_histogram.record(duration, attributes)
+        self._add(agent, **{f"{model}_{outcome}": 1, "seconds": duration})
+
+    def record_empty(self, agent: str, result: Any, reprompted: bool) -> None:
+        """An empty answer was discarded; `reprompted` when another call follows it."""
+        usage: Optional[Dict[str, Any]] = getattr(result, "usage_metadata", None)
+        tokens = (usage or {}).get("total_tokens") or 0
+        if tokens:
+            wasted_token_counter.add(tokens, {"agent": agent})
+        if reprompted:
+            reprompt_counter.add(1, {"agent": agent})
+        self._add(agent, reprompts=int(reprompted), reprompt_tokens=tokens)
+
+    def record_fallback(self, agent: str, target: str) -> None:
+        fallback_counter.add(1, {"agent": agent, "target": target})
+        self._add(agent, **{f"fallback_to_{target}": 1})
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                agent: {key: round(value, 3) if isinstance(value, float) else value for key, value in counts.items()}
+                for agent, counts in self._counts.items()
+            }
+
+
+assistant_metrics = AssistantMetrics()
@@ -0,0 +1,203 @@
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import joblib
+import numpy as np
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from config.config_loader import CONFIG
+from utils.logging.logger import get_logger
+from utils.utils import get_value_from_dict
+from ..appointment_graph.state import ToAppointmentAssistant
+from ..it_graph.state import ToITAssistant
+from ..shop_graph.state import ToShopAssistant
+
+logger = get_logger(__name__)
+
+ROUTER_ENABLED = get_value_from_dict("fast_router_config.enabled", CONFIG or {}, default=True)()
+ROUTER_MODEL_PATH = get_value_from_dict("fast_router_config.model_path", CONFIG or {}, default="saved_models/fast_router.joblib")()
+MIN_CONFIDENCE = get_value_from_dict("fast_router_config.min_confidence", CONFIG or {}, default=0.45)()
+MIN_MARGIN = get_value_from_dict("fast_router_config.min_margin", CONFIG or {}, default=0.15)()
+
+PRIMARY = "primary_assistant"
+
+# Graph node reached through each handoff / tool call of the primary assistant
+HANDOFF_ROUTES = {
+    ToShopAssistant.__name__: "enter_shop_node",
+    ToITAssistant.__name__: "enter_it_node",
+    ToAppointmentAssistant.__name__: "enter_appointment_node",
+    "rag_agent": "rag_agent_node",
+    "url_extraction": "url_agent_node",
+    "url_followup": "url_followup_node",
+}
+ROUTE_TOOLS = {route: name for name, route in HANDOFF_ROUTES.items()}
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+")
+# Only phrases that name a single sub-agent; a message matching rules of two routes goes to the classifier
+ROUTE_RULES = [
+    ("enter_appointment_node", re.compile(r"\b(đặt lịch|lịch hẹn|hẹn lịch|hủy lịch|huỷ lịch|dời lịch|appointment)\b", re.I)),
+    ("enter_shop_node", re.compile(r"\b(đơn hàng|mã đơn|hủy đơn|huỷ đơn|theo dõi đơn|track (my )?order|cancel (my )?order)\b", re.I)),
+    ("enter_it_node", re.compile(r"\b(ticket|phiếu hỗ trợ|yêu cầu hỗ trợ it)\b", re.I)),
+    ("rag_agent_node", re.compile(r"\b(chính sách|đổi trả|hoàn tiền|policy|refund)\b", re.I)),
+]
+
+
+class RouteDecision(NamedTuple):
+    route: str
+    score: float
+    source: str
+
+
+class CentroidRouter:
+    """
+    Nearest-centroid intent classifier over character n-gram TF-IDF.
+
+    Each route is the normalized mean of its training messages; a message goes to
+    the closest centroid by cosine similarity. Trained offline from the logged
+    DynamoDB history (services/train_fast_router.py) and loaded from disk.
+    """
+
+    def __init__(self, ngram_range=(2, 4), min_df: int = 2):
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=ngram_range, min_df=min_df, sublinear_tf=True)
+        self.labels: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str]) -> "CentroidRouter":
+        matrix = self.vectorizer.fit_transform([text.lower() for text in texts])
+        labels = np.asarray(labels)
+        self.labels = sorted(set(labels.tolist()))
+        centroids = np.vstack([np.asarray(matrix[labels == label].mean(axis=0)) for label in self.labels])
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.centroids = centroids / np.where(norms == 0, 1, norms)
+        return self
+
+    def scores(self, texts: Sequence[str]) -> np.ndarray:
+        """Cosine similarity of each text to each centroid (rows: texts, columns: self.labels)."""
+        return np.asarray(self.vectorizer.transform([text.lower() for text in texts]) @ self.centroids.T)
+
+    def predict(self, text: str) -> Dict[str, Any]:
+        scores = self.scores([text])[0]
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        return {"route": self.labels[order[0]], "score": best, "margin": best - runner_up}
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CentroidRouter":
+        return joblib.load(path)
+
+
+def resolve_model_path(path: str = ROUTER_MODEL_PATH) -> Path:
+    """Relative paths are taken from the service root, next to config/ (like config.yaml)."""
+    model_path = Path(path)
+    if not model_path.is_absolute():
+        model_path = Path(__file__).parents[3] / model_path
+    return model_path
+
+
+def _message_text(message: HumanMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(part.get("text", "") for part in message.content if isinstance(part, dict))
+
+
+class FastRouter:
+    """
+    Graph node in front of primary_assistant that skips its routing LLM call
+    when the intent is clear.
+
+    Rules are tried first (a URL, or phrases that name one sub-agent), then the
+    centroid classifier when a trained model is available. On a confident match
+    the node appends the same handoff tool call the primary assistant would have
+    made, so `route_primary_assistant` and the entry / tool nodes work unchanged.
+    Otherwise it adds nothing and primary_assistant runs as before.
+    """
+
+    def __init__(
+        self,
+        classifier: Optional[CentroidRouter] = None,
+        min_confidence: float = MIN_CONFIDENCE,
+        min_margin: float = MIN_MARGIN,
+        enabled: bool = ROUTER_ENABLED,
+    ):
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.enabled = enabled
+
+    def classify(self, text: str) -> Optional[RouteDecision]:
+        if URL_PATTERN.search(text):
+            return RouteDecision("url_agent_node", 1.0, "rule")
+        matched = {route for route, pattern in ROUTE_RULES if pattern.search(text)}
+        if len(matched) == 1:
+            return RouteDecision(matched.pop(), 1.0, "rule")
+        if self.classifier is None:
+            return None
+        prediction = self.classifier.predict(text)
+        if prediction["score"] < self.min_confidence or prediction["margin"] < self.min_margin:
+            return None
+        return RouteDecision(prediction["route"], prediction["score"], "centroid")
+
+    @staticmethod
+    def _tool_args(route: str, text: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        if route == "rag_agent_node":
+            return {"user_input": text, "conversation_id": state.get("conversation_id")}
+        if route == "url_agent_node":
+            return {"user_input": text, "urls": URL_PATTERN.findall(text)}
+        if route == "url_followup_node":
+            return {"user_input": text}
+        return {"user_id": state.get("user_id"), "email": state.get("email"), "request": text}
+
+    def __call__(self, state: Dict[str, Any], config: RunnableConfig = None) -> Dict[str, Any]:
+        messages = state.get("messages") or []
+        if not self.enabled or not messages or not isinstance(messages[-1], HumanMessage):
+            return {}
+        text = _message_text(messages[-1])
+        decision = self.classify(text)
+        if decision is None or decision.route not in ROUTE_TOOLS:
+            return {}
+        logger.info(f"Fast route to {decision.route} ({decision.source}, score={decision.score:.2f})")
+        tool_call = {
+            "name": ROUTE_TOOLS[decision.route],
+            "args": self._tool_args(decision.route, text, state),
+            "id": f"call_{uuid.uuid4().hex[:24]}",
+            "type": "tool_call",
+        }
+        return {
+            "messages": [AIMessage(
+                content="",
+                tool_calls=[tool_call],
+                response_metadata={"fast_router": decision._asdict()},
+            )]
+        }
+
+    async def acall(self, state: Dict[str, Any], config: RunnableConfig = None) -> Dict[str, Any]:
+        # CPU-only and sub-millisecond; no need for a worker thread
+        return self(state, config)
+
+    def as_runnable(self) -> Runnable:
+        return RunnableLambda(self, afunc=self.acall, name="FastRouter")
+
+
+def load_fast_router() -> FastRouter:
+    """FastRouter with the trained classifier when the model file exists, rules only otherwise."""
+    model_path = resolve_model_path()
+    classifier = None
+    if ROUTER_ENABLED and model_path.exists():
+        try:
+            classifier = CentroidRouter.load(str(model_path))
+            logger.info(f"Loaded fast router model from {model_path} (routes: {classifier.labels})")
+        except Exception as e:
+            logger.error(f"Could not load fast router model from {model_path}: {e}")
+    elif ROUTER_ENABLED:
+        logger.info(f"No fast router model at {model_path}; routing with rules only")
+    return FastRouter(classifier)
@@ -1,7 +1,9 @@
 from langgraph.graph import END, StateGraph, START
 from .state import AgenticState, Assistant,pop_dialog_state
+from .memory import ConversationMemory
+from .fast_router import load_fast_router
 from .tools.support_nodes import create_entry_node, create_tool_node_with_fallback
-from .primary_assistant import assistant_runnable, update_it_runnable, update_shop_runnable,update_appointment_runnable, route_update_shop,route_primary_assistant,route_update_it,route_update_appointment
+from .primary_assistant import llm, fallback_runnables, assistant_runnable, update_it_runnable, update_shop_runnable,update_appointment_runnable, route_update_shop,route_primary_assistant,route_fast_router,route_update_it,route_update_appointment
 from ..shop_graph.shop_agent import shop_sensitive_tools,shop_safe_tools
 from ..it_graph.it_agent import it_sensitive_tools,it_safe_tools
 from ..appointment_graph.appointment_agent import appointment_sensitive_tools,appointment_safe_tools
@@ -18,24 +20,26 @@ def setup_agentic_graph():
     builder = StateGraph(AgenticState)
     
     # Add nodes
-    builder.add_node("primary_assistant", Assistant(assistant_runnable))
+    builder.add_node("manage_memory", ConversationMemory(llm).as_runnable())
+    builder.add_node("fast_router", load_fast_router().as_runnable())
+    builder.add_node("primary_assistant", Assistant(assistant_runnable, "primary_assistant", fallback_runnables.get("primary_assistant")).as_runnable())
 
     # shop assistant nodes
     builder.add_node("enter_shop_node", create_entry_node("Shop Assistant", "call_shop_agent"))
-    builder.add_node("call_shop_agent", Assistant(update_shop_runnable))
+    builder.add_node("call_shop_agent", Assistant(update_shop_runnable, "call_shop_agent", fallback_runnables.get("call_shop_agent")).as_runnable())
     builder.add_node("update_shop_sensitive_tools", create_tool_node_with_fallback(shop_sensitive_tools))
     builder.add_node("update_shop_safe_tools", create_tool_node_with_fallback(shop_safe_tools))
     builder.add_node("leave_skill", pop_dialog_state)
     
     # it assistant nodes
     builder.add_node("enter_it_node", create_entry_node("IT Assistant", "call_it_agent"))
-    builder.add_node("call_it_agent", Assistant(update_it_runnable))
+    builder.add_node("call_it_agent", Assistant(update_it_runnable, "call_it_agent", fallback_runnables.get("call_it_agent")).as_runnable())
     builder.add_node("update_it_sensitive_tools", create_tool_node_with_fallback(it_sensitive_tools))
     builder.add_node("update_it_safe_tools", create_tool_node_with_fallback(it_safe_tools))
     
     # appointment assistant nodes
     builder.add_node("enter_appointment_node", create_entry_node("Appointment Assistant", "call_appointment_agent"))
-    builder.add_node("call_appointment_agent", Assistant(update_appointment_runnable))
+    builder.add_node("call_appointment_agent", Assistant(update_appointment_runnable, "call_appointment_agent", fallback_runnables.get("call_appointment_agent")).as_runnable())
     builder.add_node("update_appointment_sensitive_tools", create_tool_node_with_fallback(appointment_sensitive_tools))
     builder.add_node("update_appointment_safe_tools", create_tool_node_with_fallback(appointment_safe_tools))
     
@@ -46,7 +50,8 @@ def setup_agentic_graph():
     builder.add_node("url_followup_node", create_tool_node_with_fallback([url_followup]))
     
     # Add edges
-    builder.add_edge(START, "primary_assistant")
+    builder.add_edge(START, "manage_memory")
+    builder.add_edge("manage_memory", "fast_router")
     
     # shop assistant edges
     builder.add_edge("enter_shop_node", "call_shop_agent")
@@ -68,6 +73,12 @@ def setup_agentic_graph():
     builder.add_edge("url_agent_node", "primary_assistant")
     builder.add_edge("url_followup_node", "primary_assistant")
 
+    builder.add_conditional_edges(
+        "fast_router",
+        route_fast_router,
+        ["primary_assistant", "enter_shop_node", "enter_it_node", "enter_appointment_node", "rag_agent_node", "url_agent_node", "url_followup_node", END],
+    )
+
     builder.add_conditional_edges(
         "primary_assistant",
         route_primary_assistant,
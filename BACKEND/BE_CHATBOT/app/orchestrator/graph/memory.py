@@ -0,0 +1,161 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from config.config_loader import CONFIG
+from utils.logging.logger import get_logger
+from utils.token_counter import tiktoken_counter
+from utils.utils import get_value_from_dict
+
+logger = get_logger(__name__)
+
+KEEP_TURNS = get_value_from_dict("memory_config.keep_turns", CONFIG or {}, default=6)()
+SUMMARIZE_AFTER_TURNS = get_value_from_dict("memory_config.summarize_after_turns", CONFIG or {}, default=10)()
+SUMMARY_MAX_TOKENS = get_value_from_dict("memory_config.summary_max_tokens", CONFIG or {}, default=400)()
+DEFAULT_TOKEN_BUDGET = get_value_from_dict("memory_config.default_token_budget", CONFIG or {}, default=4000)()
+TOKEN_BUDGETS: Dict[str, int] = get_value_from_dict("memory_config.token_budget", CONFIG or {}, default={})() or {}
+# Tool results can be whole product listings; the summarizer only needs their gist
+TOOL_RESULT_CHARS = 600
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a customer and the FPT Shop assistant.
+Merge the earlier summary (may be empty) with the new part of the conversation into one updated summary.
+Keep every fact the assistant may need later: the customer's needs and budget, devices recommended or compared,
+order ids, order and appointment details, emails, decisions taken and open questions.
+Drop greetings and small talk. Write in the customer's language, at most {max_words} words."""
+
+SUMMARY_MESSAGES = [
+    ("system", SUMMARY_PROMPT),
+    ("human", "Earlier summary:\n{summary}\n\nNew part of the conversation:\n{transcript}"),
+]
+summary_prompt = ChatPromptTemplate.from_messages(SUMMARY_MESSAGES).partial(max_words=str(SUMMARY_MAX_TOKENS // 2))
+
+
+def token_budget_for(agent: str) -> int:
+    """Prompt budget (history tokens) of an assistant node, from memory_config.token_budget."""
+    return int(TOKEN_BUDGETS.get(agent, DEFAULT_TOKEN_BUDGET))
+
+
+def turn_boundaries(messages: Sequence[AnyMessage]) -> List[int]:
+    """
+    Indexes where the history can be cut: each HumanMessage that starts a turn,
+    unless a tool call issued before it is answered by a ToolMessage after it
+    (e.g. a sensitive tool still waiting for confirmation). Cutting anywhere
+    else would leave a ToolMessage without its AIMessage, which the model APIs reject.
+    """
+    issued: Dict[str, int] = {}
+    open_spans = []
+    for i, message in enumerate(messages):
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls or []:
+                issued[tool_call["id"]] = i
+        elif isinstance(message, ToolMessage) and message.tool_call_id in issued:
+            open_spans.append((issued[message.tool_call_id], i))
+    return [
+        i for i, message in enumerate(messages)
+        if isinstance(message, HumanMessage) and not any(start < i <= end for start, end in open_spans)
+    ]
+
+
+def window_messages(messages: Sequence[AnyMessage], budget: int, summary: Optional[str] = None) -> List[AnyMessage]:
+    """
+    The most recent whole turns that fit in `budget` tokens, preceded by the
+    rolling summary. The latest turn is always kept, whatever its size.
+    """
+    boundaries = turn_boundaries(messages)
+    start = boundaries[-1] if boundaries else 0
+    for boundary in reversed(boundaries[:-1]):
+        if tiktoken_counter(messages[boundary:]) > budget:
+            break
+        start = boundary
+    window = list(messages[start:])
+    if summary:
+        window.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    return window
+
+
+def _transcript(messages: Sequence[AnyMessage]) -> str:
+    lines = []
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else " ".join(
+            part.get("text", "") for part in message.content if isinstance(part, dict)
+        )
+        if isinstance(message, HumanMessage):
+            lines.append(f"Customer: {content}")
+        elif isinstance(message, AIMessage):
+            if content:
+                lines.append(f"Assistant: {content}")
+            for tool_call in message.tool_calls or []:
+                lines.append(f"Assistant called {tool_call['name']}({tool_call.get('args', {})})")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Tool result: {content[:TOOL_RESULT_CHARS]}")
+    return "\n".join(lines)
+
+
+class ConversationMemory:
+    """
+    Graph node run at the start of every turn.
+
+    Once the history holds more than SUMMARIZE_AFTER_TURNS turns, everything but
+    the last KEEP_TURNS is folded into the rolling `summary` and removed from
+    `messages` (so the checkpoint stops growing too). Folding in batches keeps the
+    summarizer call to one every few turns rather than one per turn.
+    """
+
+    def __init__(self, llm: BaseChatModel, keep_turns: int = KEEP_TURNS, summarize_after_turns: int = SUMMARIZE_AFTER_TURNS):
+        self.keep_turns = max(1, keep_turns)
+        self.summarize_after_turns = max(self.keep_turns, summarize_after_turns)
+        self.chain = summary_prompt | llm.bind(max_tokens=SUMMARY_MAX_TOKENS)
+
+    def _folded(self, state: Dict[str, Any]) -> List[AnyMessage]:
+        messages = state.get("messages") or []
+        boundaries = turn_boundaries(messages)
+        if len(boundaries) <= self.summarize_after_turns:
+            return []
+        return list(messages[:boundaries[-self.keep_turns]])
+
+    @staticmethod
+    def _update(folded: List[AnyMessage], summary) -> Dict[str, Any]:
+        logger.info(f"Folded {len(folded)} messages into the conversation summary")
+        return {
+            "summary": summary.content,
+            "messages": [RemoveMessage(id=message.id) for message in folded],
+        }
+
+    def _inputs(self, state: Dict[str, Any], folded: List[AnyMessage]) -> Dict[str, str]:
+        return {"summary": state.get("summary") or "(none)", "transcript": _transcript(folded)}
+
+    def __call__(self, state: Dict[str, Any], config: RunnableConfig = None) -> Dict[str, Any]:
+        folded = self._folded(state)
+        if not folded:
+            return {}
+        try:
+            summary = self.chain.invoke(self._inputs(state, folded), config)
+        except Exception as e:
+            # Keep the messages; the next turn tries again
+            logger.error(f"Conversation summary failed: {e}")
+            return {}
+        return self._update(folded, summary)
+
+    async def acall(self, state: Dict[str, Any], config: RunnableConfig = None) -> Dict[str, Any]:
+        folded = self._folded(state)
+        if not folded:
+            return {}
+        try:
+            summary = await self.chain.ainvoke(self._inputs(state, folded), config)
+        except Exception as e:
+            logger.error(f"Conversation summary failed: {e}")
+            return {}
+        return self._update(folded, summary)
+
+    def as_runnable(self) -> Runnable:
+        return RunnableLambda(self, afunc=self.acall, name="ConversationMemory")
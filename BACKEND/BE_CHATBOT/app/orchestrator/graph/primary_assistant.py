@@ -1,7 +1,8 @@
 import datetime
-from langchain_core.runnables import RunnableLambda
-from .state import AgenticState
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from .state import AgenticState, INVOKE_TIMEOUT
 from langgraph.graph import END
+from langchain_core.messages import AIMessage
 from langgraph.prebuilt import tools_condition
 from config.base_config import APP_CONFIG
 from langchain_openai import ChatOpenAI
@@ -19,34 +20,75 @@ from ..appointment_graph.appointment_agent  import create_appointment_tool , app
 from ..it_graph.state import ToITAssistant
 from ..it_graph.it_agent import create_it_tool, it_safe_tools
 from .tools.support_nodes import inject_user_info
+from config.config_loader import CONFIG
+from utils.utils import get_value_from_dict
 chat_config = APP_CONFIG.chat_model_config
 import os
 from utils.logging.logger import get_logger
 logger = get_logger(__name__)
 
+# Model tried once when an assistant exhausts its retry budget (unset: no fallback)
+FALLBACK_MODEL = get_value_from_dict("assistant_config.fallback_model", CONFIG or {}, default=None)()
+
+if chat_config:
+    # The HTTP request itself is abandoned after INVOKE_TIMEOUT, also on the sync path
+    chat_config = chat_config.model_copy(update={"kwargs": {"timeout": INVOKE_TIMEOUT, **(chat_config.kwargs or {})}})
+
 if not chat_config:
     llm = ChatOpenAI(
         openai_api_key=os.getenv("OPENAI_API_KEY"),   
         model="gpt-4o-mini",     
         temperature=0,
-        max_tokens=3000
+        max_tokens=3000,
+        timeout=INVOKE_TIMEOUT
     )
 else:
     llm = create_chat_model(chat_config)
-    
-def assistant_runnable_with_user_info(state):
-    result = (primary_assistant_prompt | llm.bind_tools([ToShopAssistant, ToAppointmentAssistant, ToITAssistant, RAG_Agent, url_extraction, url_followup])).invoke(state)
-    return inject_user_info(state, result)
+
+if not FALLBACK_MODEL:
+    fallback_llm = None
+elif not chat_config:
+    fallback_llm = ChatOpenAI(
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        model=FALLBACK_MODEL,
+        temperature=0,
+        max_tokens=3000,
+        timeout=INVOKE_TIMEOUT
+    )
+else:
+    fallback_llm = create_chat_model(chat_config.model_copy(update={"model": FALLBACK_MODEL}))
+
+def create_primary_tool(model):
+    """Primary assistant chain on the given model, filling user_id / email into handoffs."""
+    chain = primary_assistant_prompt | model.bind_tools([ToShopAssistant, ToAppointmentAssistant, ToITAssistant, RAG_Agent, url_extraction, url_followup])
+
+    def assistant_runnable_with_user_info(state, config: RunnableConfig = None):
+        result = chain.invoke(state, config)
+        return inject_user_info(state, result)
+
+    async def aassistant_runnable_with_user_info(state, config: RunnableConfig = None):
+        result = await chain.ainvoke(state, config)
+        return inject_user_info(state, result)
+
+    return RunnableLambda(assistant_runnable_with_user_info, afunc=aassistant_runnable_with_user_info)
 
 MAIN_SYSTEM_MESSAGES = [
     ("system", MAIN_SYSTEM_PROMPT.strip()),
     ("placeholder", "{messages}")
 ]
 primary_assistant_prompt = ChatPromptTemplate.from_messages(MAIN_SYSTEM_MESSAGES).partial(time=datetime.datetime.now)
+assistant_runnable = create_primary_tool(llm)
 update_shop_runnable = create_shop_tool(llm)
 update_appointment_runnable = create_appointment_tool(llm)
 update_it_runnable = create_it_tool(llm)
-assistant_runnable = RunnableLambda(assistant_runnable_with_user_info)
+
+# Same prompts and tools on the fallback model, keyed by graph node
+fallback_runnables = {
+    "primary_assistant": create_primary_tool(fallback_llm),
+    "call_shop_agent": create_shop_tool(fallback_llm),
+    "call_appointment_agent": create_appointment_tool(fallback_llm),
+    "call_it_agent": create_it_tool(fallback_llm),
+} if fallback_llm else {}
 
 def route_primary_assistant(state: AgenticState):
     route = tools_condition(state)
@@ -75,6 +117,13 @@ def route_primary_assistant(state: AgenticState):
     
     return END
 
+def route_fast_router(state: AgenticState):
+    """Follow the fast router's handoff when it made one, otherwise let primary_assistant decide."""
+    last_message = state["messages"][-1] if state["messages"] else None
+    if isinstance(last_message, AIMessage) and last_message.tool_calls:
+        return route_primary_assistant(state)
+    return "primary_assistant"
+
 def route_update_shop(state: AgenticState):
     route = tools_condition(state)
     if route == END:
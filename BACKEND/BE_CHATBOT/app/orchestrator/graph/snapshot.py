@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AnyMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.pregel import Pregel
+from langgraph.types import StateSnapshot
+
+
+class TurnState:
+    """
+    Per-turn view of a conversation's graph state.
+
+    The checkpoint is read once when the turn starts. While the graph runs, the
+    state values it streams are recorded in memory, so the messages the run
+    appended are known without reading the checkpointer again. Only `final()`
+    reads it a second time, and only when the caller needs the post-run
+    snapshot metadata (e.g. `next` to detect an interrupt before a sensitive tool).
+    """
+
+    def __init__(self, graph: Pregel, config: RunnableConfig):
+        self.graph = graph
+        self.config = config
+        self._initial: Optional[StateSnapshot] = None
+        self._final: Optional[StateSnapshot] = None
+        self._values: Optional[Dict[str, Any]] = None
+
+    async def load(self) -> StateSnapshot:
+        """Read the checkpoint at the start of the turn (once)."""
+        if self._initial is None:
+            self._initial = await self.graph.aget_state(self.config)
+        return self._initial
+
+    @property
+    def initial(self) -> StateSnapshot:
+        if self._initial is None:
+            raise RuntimeError("TurnState.load() must be awaited first")
+        return self._initial
+
+    @property
+    def initial_messages(self) -> List[AnyMessage]:
+        return list(self.initial.values.get("messages", [])) if self.initial.values else []
+
+    def track(self, values: Optional[Dict[str, Any]]) -> None:
+        """Record the latest state values streamed by the graph run."""
+        if values:
+            self._values = values
+            self._final = None
+
+    @property
+    def values(self) -> Dict[str, Any]:
+        """Latest known state values: what the run streamed, else the initial checkpoint."""
+        if self._values is not None:
+            return self._values
+        return self.initial.values or {}
+
+    @property
+    def messages(self) -> List[AnyMessage]:
+        return list(self.values.get("messages", []))
+
+    async def final(self) -> StateSnapshot:
+        """Post-run snapshot; read from the checkpointer at most once per run."""
+        if self._values is None:
+            return self.initial
+        if self._final is None:
+            self._final = await self.graph.aget_state(self.config)
+        return self._final
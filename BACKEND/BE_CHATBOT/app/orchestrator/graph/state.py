@@ -1,11 +1,28 @@
+import asyncio
+import time
 from typing import Annotated, Optional, List
-from langchain_core.messages import AnyMessage
+from langchain_core.messages import AnyMessage, AIMessage
 from langgraph.graph import add_messages
 from typing_extensions import TypedDict, Literal
-from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 from langchain_core.messages import ToolMessage
 from pydantic import EmailStr
 
+from config.config_loader import CONFIG
+from utils.logging.logger import get_logger
+from utils.utils import get_value_from_dict
+from .assistant_metrics import assistant_metrics
+from .memory import token_budget_for, window_messages
+
+logger = get_logger(__name__)
+
+# Re-prompts (or retries after a timeout/error) before the fallback model is tried
+MAX_REPROMPTS = get_value_from_dict("assistant_config.max_reprompts", CONFIG or {}, default=2)()
+INVOKE_TIMEOUT = get_value_from_dict("assistant_config.timeout_seconds", CONFIG or {}, default=60)()
+BACKOFF_BASE = get_value_from_dict("assistant_config.backoff_base", CONFIG or {}, default=0.5)()
+BACKOFF_MAX = get_value_from_dict("assistant_config.backoff_max", CONFIG or {}, default=4.0)()
+UNAVAILABLE_REPLY = "I'm sorry, I can't answer that right now. Please try again in a moment."
+
 
 def merge_recommended_devices(left: Optional[List[str]], right: Optional[List[str]]) -> Optional[List[str]]:
     """Merge recommended devices lists, with right taking precedence."""
@@ -54,24 +71,140 @@ class AgenticState(InputState):
     conversation_id: Annotated[str, "The unique identifier for the conversation"]
     user_id: Annotated[str, "The unique identifier for the user"]
     email: Annotated[EmailStr,"The email of the customer ordering"]
+    summary: Annotated[str, "Rolling summary of the turns folded out of messages"]
     
 class Assistant:
-    def __init__(self, runnable: Runnable):
+    """
+    Graph node around an assistant runnable.
+
+    An empty answer is re-prompted, and a timed-out or failed call retried, at most
+    `max_reprompts` times with exponential backoff. After that the fallback
+    runnable (same prompt and tools on the fallback model) gets one try, and if
+    that fails too the turn ends with UNAVAILABLE_REPLY instead of looping.
+    """
+
+    def __init__(
+        self,
+        runnable: Runnable,
+        name: Optional[str] = None,
+        fallback: Optional[Runnable] = None,
+        max_reprompts: int = MAX_REPROMPTS,
+        timeout: float = INVOKE_TIMEOUT,
+    ):
         self.runnable = runnable
+        self.name = name or "assistant"
+        self.fallback = fallback
+        self.max_reprompts = max(0, max_reprompts)
+        self.timeout = timeout
+        # History the runnable sees is capped at the node's memory_config.token_budget
+        self.token_budget = token_budget_for(name or "")
+
+    def __call__(self, state: AgenticState, config: RunnableConfig = None):
+        prompt_state = self._windowed(state)
+        for attempt in range(self.max_reprompts + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt))
+            result = self._invoke(self.runnable, prompt_state, config, "primary")
+            if result is None:
+                continue
+            if not self._needs_retry(result):
+                return self._finish(state, result)
+            prompt_state = self._reprompt(prompt_state, result, attempt < self.max_reprompts)
+
+        result = None
+        if self.fallback is not None:
+            result = self._invoke(self.fallback, self._windowed(state), config, "fallback")
+        return self._finish(state, self._fallback_result(result))
+
+    async def acall(self, state: AgenticState, config: RunnableConfig = None):
+        """Async twin of __call__, used when the graph runs through astream/ainvoke."""
+        prompt_state = self._windowed(state)
+        for attempt in range(self.max_reprompts + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt))
+            result = await self._ainvoke(self.runnable, prompt_state, config, "primary")
+            if result is None:
+                continue
+            if not self._needs_retry(result):
+                return self._finish(state, result)
+            prompt_state = self._reprompt(prompt_state, result, attempt < self.max_reprompts)
+
+        result = None
+        if self.fallback is not None:
+            result = await self._ainvoke(self.fallback, self._windowed(state), config, "fallback")
+        return self._finish(state, self._fallback_result(result))
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
 
-    def __call__(self, state: AgenticState):
-        while True:
-            result = self.runnable.invoke(state)
-
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
-                messages = state["messages"] + [("user", "Respond with a real output.")]
-                state = {**state, "messages": messages}
-            else:
-                break
+    def _invoke(self, runnable: Runnable, state: AgenticState, config: RunnableConfig, model: str):
+        """
+        One call; None when it raised. A running sync call cannot be cancelled from
+        here, so this path relies on the chat model's own request timeout (set to
+        INVOKE_TIMEOUT in primary_assistant.py), which aborts the HTTP call itself.
+        """
+        started = time.perf_counter()
+        try:
+            result = runnable.invoke(state, config)
+        except Exception as e:
+            return self._failed(model, "error", started, e)
+        return self._succeeded(model, started, result)
+
+    async def _ainvoke(self, runnable: Runnable, state: AgenticState, config: RunnableConfig, model: str):
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(runnable.ainvoke(state, config), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return self._failed(model, "timeout", started, f"no answer after {self.timeout}s")
+        except Exception as e:
+            return self._failed(model, "error", started, e)
+        return self._succeeded(model, started, result)
+
+    def _succeeded(self, model: str, started: float, result):
+        outcome = "empty" if self._needs_retry(result) else "ok"
+        assistant_metrics.record_invocation(self.name, model, outcome, time.perf_counter() - started)
+        return result
+
+    def _failed(self, model: str, outcome: str, started: float, error) -> None:
+        assistant_metrics.record_invocation(self.name, model, outcome, time.perf_counter() - started)
+        logger.warning(f"{self.name} {model} model call failed ({outcome}): {error}")
+        return None
+
+    def _reprompt(self, prompt_state: AgenticState, result, retry: bool) -> AgenticState:
+        assistant_metrics.record_empty(self.name, result, reprompted=retry)
+        if not retry:
+            return prompt_state
+        logger.warning(f"{self.name} returned an empty answer, re-prompting")
+        return self._ask_for_real_output(prompt_state)
+
+    def _fallback_result(self, result):
+        if result is not None and not self._needs_retry(result):
+            assistant_metrics.record_fallback(self.name, "model")
+            return result
+        assistant_metrics.record_fallback(self.name, "reply")
+        logger.error(f"{self.name} gave no usable answer within its retry budget, replying with the unavailable message")
+        return AIMessage(content=UNAVAILABLE_REPLY)
+
+    def _windowed(self, state: AgenticState) -> AgenticState:
+        messages = window_messages(state["messages"], self.token_budget, state.get("summary"))
+        return {**state, "messages": messages}
+
+    @staticmethod
+    def _needs_retry(result) -> bool:
+        return not result.tool_calls and (
+            not result.content
+            or isinstance(result.content, list)
+            and not result.content[0].get("text")
+        )
+
+    @staticmethod
+    def _ask_for_real_output(state: AgenticState) -> AgenticState:
+        messages = state["messages"] + [("user", "Respond with a real output.")]
+        return {**state, "messages": messages}
+
+    @staticmethod
+    def _finish(state: AgenticState, result):
         if hasattr(result, "tool_calls") and result.tool_calls:
             for tool_call in result.tool_calls:
                 if tool_call.get("name") == "recommend_system" and tool_call.get("return_value"):
@@ -83,6 +216,10 @@ class Assistant:
                         if isinstance(state, dict):
                             state["recommended_devices"] = device_names
         return {"messages": result}
+
+    def as_runnable(self) -> Runnable:
+        """Graph node exposing both the sync and the async entry point."""
+        return RunnableLambda(self, afunc=self.acall, name="Assistant")
     
     
 def pop_dialog_state(state: AgenticState) -> dict:
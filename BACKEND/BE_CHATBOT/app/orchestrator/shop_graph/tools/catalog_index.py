@@ -0,0 +1,194 @@
+import hashlib
+import json
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+TEXT_FIELDS = [
+    "device_name", "cpu", "card", "brand", "battery",
+    "storage", "discount_percent", "sales_price", "guarantee_program"
+]
+
+FIELD_RELEVANCE_CACHE_SIZE = 1024
+
+_TOKEN_PATTERN = re.compile(r"\d+|[^\W\d_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split lowercased text into word and number tokens ("256gb" -> ["256", "gb"])."""
+    return _TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+def normalize_name(name) -> str:
+    """Canonical form of a device name used as hash key ("  iPhone 16  Pro" -> "iphone 16 pro")."""
+    return " ".join(str(name).lower().split()) if name else ""
+
+
+def _to_text(value) -> str:
+    """Flatten a metadata value into the lowercased text used for matching."""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(str(item) for item in value).lower()
+    return str(value).lower()
+
+
+def _fit_tfidf(values: List[str]) -> Optional[Tuple[TfidfVectorizer, csr_matrix]]:
+    """Fit a vectorizer on one field column; None when the column has no usable tokens."""
+    vectorizer = TfidfVectorizer()
+    try:
+        matrix = vectorizer.fit_transform(values)
+    except ValueError:
+        return None
+    return vectorizer, matrix.tocsr()
+
+
+def _fingerprint(points: list, metadata: List[dict]) -> str:
+    """Content hash of the indexed points; identical catalogs hash identically in every worker."""
+    digest = hashlib.blake2b(digest_size=12)
+    for point, meta in sorted(zip(points, metadata), key=lambda item: str(item[0].id)):
+        digest.update(str(point.id).encode())
+        digest.update(json.dumps(meta, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _to_price(value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+class CatalogIndex:
+    """
+    Columnar view over the catalog points of one cache entry.
+
+    Built once per cache refresh so the recommender never has to walk raw
+    Qdrant payloads: prices, brand/category ids and pre-lowered text fields
+    are stored as arrays indexed by point position, with posting lists per
+    category and per brand. One TF-IDF model per text field is fitted on the
+    entry's documents and kept with its (L2-normalised) document matrix, and
+    a token vocabulary per field backs the field-relevance estimate.
+    """
+
+    def __init__(self, points: list, text_fields: Optional[List[str]] = None):
+        self.points = points if isinstance(points, list) else list(points)
+        self.text_fields = list(TEXT_FIELDS if text_fields is None else text_fields)
+        self.metadata = [point.payload.get("metadata", {}) or {} for point in self.points]
+        self.fingerprint = _fingerprint(self.points, self.metadata)
+
+        size = len(self.points)
+        self.sale_price = np.array([_to_price(meta.get("sale_price")) for meta in self.metadata], dtype=float)
+        self.text: Dict[str, List[str]] = {
+            field: [_to_text(meta.get(field, "")) for meta in self.metadata]
+            for field in self.text_fields
+        }
+
+        self.brand_names: List[str] = []
+        self.category_names: List[str] = []
+        self.brand_ids = np.empty(size, dtype=np.int32)
+        self.category_ids = np.empty(size, dtype=np.int32)
+        brand_lookup: Dict[str, int] = {}
+        category_lookup: Dict[str, int] = {}
+        for position, meta in enumerate(self.metadata):
+            brand = meta.get("brand")
+            brand = brand.lower() if isinstance(brand, str) else ""
+            category = _to_text(meta.get("category", ""))
+            self.brand_ids[position] = brand_lookup.setdefault(brand, len(brand_lookup))
+            self.category_ids[position] = category_lookup.setdefault(category, len(category_lookup))
+        self.brand_names = list(brand_lookup)
+        self.category_names = list(category_lookup)
+
+        self.by_brand: Dict[str, np.ndarray] = {
+            name: np.flatnonzero(self.brand_ids == brand_id) for name, brand_id in brand_lookup.items()
+        }
+        self.by_category: Dict[str, np.ndarray] = {
+            name: np.flatnonzero(self.category_ids == category_id) for name, category_id in category_lookup.items()
+        }
+
+        self.tfidf: Dict[str, Optional[Tuple[TfidfVectorizer, csr_matrix]]] = {
+            field: _fit_tfidf(values) for field, values in self.text.items()
+        }
+
+        # normalized device_name -> position, first occurrence wins
+        self.by_name: Dict[str, int] = {}
+        for position, meta in enumerate(self.metadata):
+            name = normalize_name(meta.get("device_name"))
+            if name:
+                self.by_name.setdefault(name, position)
+
+        # token -> number of documents containing it, per field
+        self.vocabulary: Dict[str, Counter] = {}
+        self.fill_ratio: Dict[str, float] = {}
+        for field, values in self.text.items():
+            vocabulary = Counter()
+            filled = 0
+            for value in values:
+                if value:
+                    filled += 1
+                    vocabulary.update(set(tokenize(value)))
+            self.vocabulary[field] = vocabulary
+            self.fill_ratio[field] = filled / size if size else 0.0
+
+        # Per-entry LRU: the index is rebuilt on every cache refresh, which drops stale results
+        self.field_relevance = lru_cache(maxsize=FIELD_RELEVANCE_CACHE_SIZE)(self._field_relevance)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def select(
+        self,
+        category: Optional[str] = None,
+        max_price: Optional[float] = None,
+        brands: Optional[List[str]] = None
+    ) -> np.ndarray:
+        """
+        Return the positions of candidate points, in catalog order.
+
+        Args:
+            category: Restrict to one category using its posting list
+            max_price: Drop points without a numeric sale_price or priced above this value
+            brands: Restrict to these brands (exact, case-insensitive) using their posting lists
+        """
+        if category is not None:
+            ids = self.by_category.get(category.lower(), np.empty(0, dtype=np.intp))
+        else:
+            ids = np.arange(len(self.points))
+        if brands:
+            postings = [self.by_brand[brand.lower()] for brand in brands if brand.lower() in self.by_brand]
+            ids = np.intersect1d(ids, np.concatenate(postings)) if postings else np.empty(0, dtype=np.intp)
+        if max_price is not None:
+            prices = self.sale_price[ids]
+            ids = ids[~np.isnan(prices) & (prices <= max_price)]
+        return ids
+
+    def _field_relevance(self, normalized_query: str, text_fields: Tuple[str, ...]) -> Tuple[Tuple[str, float], ...]:
+        """
+        Score fields by how much of the query vocabulary they contain, on a 0-100 scale.
+
+        A field scores the share of distinct query tokens found in its vocabulary,
+        weighted by the share of documents that have a value for the field.
+        Ties keep the order of text_fields, so rankings are reproducible.
+        """
+        query_tokens = set(normalized_query.split())
+        field_relevance = {}
+        for field in text_fields:
+            vocabulary = self.vocabulary.get(field)
+            if not query_tokens or not vocabulary:
+                field_relevance[field] = 0.0
+                continue
+            matched = sum(1 for token in query_tokens if token in vocabulary)
+            field_relevance[field] = 100 * matched / len(query_tokens) * self.fill_ratio[field]
+        return tuple(sorted(field_relevance.items(), key=lambda x: x[1], reverse=True))
+
+    def device_name(self, position: int) -> Optional[str]:
+        return self.metadata[position].get("device_name")
+
+    def find_by_name(self, name: str):
+        """O(1) lookup of a point by device name; None when absent."""
+        position = self.by_name.get(normalize_name(name))
+        return self.points[position] if position is not None else None
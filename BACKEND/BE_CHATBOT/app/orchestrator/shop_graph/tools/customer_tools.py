@@ -1,61 +1,212 @@
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
 from rapidfuzz import process
 from rapidfuzz.fuzz import partial_ratio,token_sort_ratio 
-from collections import defaultdict
 from pydantic import EmailStr
 from typing import List, Dict, Optional, Tuple
 from schemas.device_schemas import RecommendationConfig, CancelOrder, Order, TrackOrder, RecommendSystem, UpdateOrder
 from .get_score import (
-    calculate_similarities_batch, get_all_points, convert_to_string,determine_field_relevance)
+    calculate_similarities_batch, get_catalog_index, determine_field_relevance, find_device,
+    search_catalog, catalog_version, VALID_TYPES)
+from .catalog_index import CatalogIndex, TEXT_FIELDS, normalize_name
 from config.base_config import APP_CONFIG
-import json
 from .get_id import generate_short_id
+from .user_context import load_user_preferences
+from .recommendation_cache import result_cache_key, get_cached_result, store_result
 from .send_email import send_order_confirmation,send_order_update,send_order_cancel
 from utils.email import send_email
-from models.database import CustomerInfo, Order as OrderModel, Item, SessionLocal
-import heapq
+from models.database import Order as OrderModel, Item, SessionLocal
+import numpy as np
 sql_config = APP_CONFIG.sql_config
 
-# Create a function to get a database session
+# Create a function to get a database session; callers close it
 def get_shop_db():
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        db.close()
+    return SessionLocal()
 
 recommended_devices_cache = []
 METADATA_CACHE_DURATION = 300  
-def get_other_preference(user_id):
-    db = get_shop_db()
-    try:
-        user = db.query(CustomerInfo).filter(CustomerInfo.user_id == user_id).first()
-        if not user or user.age is None:
-            return {}
-        
-        similar_users = db.query(CustomerInfo.preferences).filter(
-            CustomerInfo.age.between(user.age - 3, user.age + 3),
-            CustomerInfo.preferences.isnot(None)
-        ).all()
-        
-        merged_preferences = {}
-        all_prefs = [json.loads(row[0]) for row in similar_users if row[0]]
+PRODUCT_META_FIELDS = [
+    "device_name", "cpu", "card", "screen", "storage", "image_link",
+    "sale_price", "discount_percent", "installment_price", "sales_perks", 
+    "guarantee_program", "payment_perks", "source"
+]
+
+
+def _brand_boosts(index: CatalogIndex, ids: np.ndarray, brands: List[str], recommendation_config: RecommendationConfig) -> np.ndarray:
+    """Score brand affinity once per distinct brand in the candidate set (one cdist call), then broadcast by brand id."""
+    candidate_brand_ids = index.brand_ids[ids]
+    brand_boost = np.zeros(len(index.brand_names))
+    unique_brand_ids = np.unique(candidate_brand_ids)
+    if len(unique_brand_ids) == 0:
+        return brand_boost[candidate_brand_ids]
+
+    best_brand_scores = process.cdist(
+        [index.brand_names[brand_id] for brand_id in unique_brand_ids],
+        brands,
+        scorer=partial_ratio,
+        workers=recommendation_config.FUZZY_WORKERS
+    ).max(axis=1)
+
+    brand_boost[unique_brand_ids] = np.select(
+        [best_brand_scores >= 90, best_brand_scores >= 75, best_brand_scores >= 50],
+        [
+            recommendation_config.BRAND_MATCH_STRONG,
+            recommendation_config.BRAND_MATCH_MEDIUM,
+            recommendation_config.BRAND_MATCH_WEAK
+        ],
+        default=recommendation_config.BRAND_MISMATCH_PENALTY
+    )
+    return brand_boost[candidate_brand_ids]
+
+
+def _price_boosts(
+    index: CatalogIndex,
+    ids: np.ndarray,
+    has_price_input: bool,
+    price_number: Optional[float],
+    has_price: bool,
+    price_min: Optional[float],
+    price_max: Optional[float],
+    recommendation_config: RecommendationConfig
+) -> np.ndarray:
+    """Vectorized price boost; candidates without a numeric sale_price get no boost."""
+    sale_price = index.sale_price[ids]
+    boosts = np.zeros(len(ids))
+
+    if has_price_input:
+        if price_number:
+            price_similarity = np.maximum(0, 1 - np.abs(sale_price - price_number) / price_number)
+            boosts = np.nan_to_num(price_similarity) * recommendation_config.PRICE_RANGE_MATCH_BOOST
+        return boosts
 
-        for pref in all_prefs:
-            for key, val in pref.items():
-                if isinstance(val, list):
-                    merged_preferences.setdefault(key, set()).update(val)
+    if has_price:
+        remaining = ~np.isnan(sale_price)
+        if price_min is not None and price_max is not None:
+            in_range = remaining & (sale_price >= price_min) & (sale_price <= price_max)
+            boosts[in_range] = recommendation_config.PRICE_RANGE_MATCH_BOOST
+            remaining &= ~in_range
+        if price_max is not None:
+            below = remaining & (sale_price <= price_max)
+            boosts[below] = recommendation_config.PRICE_RANGE_MATCH_BOOST * 0.7
+            remaining &= ~below
+        if price_min is not None:
+            above = remaining & (sale_price >= price_min)
+            boosts[above] = recommendation_config.PRICE_RANGE_MATCH_BOOST * 0.7
+    return boosts
+
+
+def _format_products(index: CatalogIndex, top_ids: np.ndarray, top_scores: np.ndarray, type_key: str) -> str:
+    products_info = []
+    for idx, (position, score) in enumerate(zip(top_ids, top_scores), start=1):
+        meta = index.metadata[position]
+        content = f"Product {idx} (Score: {score:.2f}) [{type_key}]:\n"
+        for field in PRODUCT_META_FIELDS:
+            if field in meta and meta[field]:
+                if field in ["sale_price", "installment_price"]:
+                    value = meta[field]
+                    if isinstance(value, (int, float)):
+                        content += f"- {field}: {value:,} VND\n"
+                    else:
+                        content += f"- {field}: {value} VND\n"
+                elif field == "discount_percent":
+                    content += f"- {field}: {meta[field]}%\n"
                 else:
-                    merged_preferences[key] = val 
+                    content += f"- {field}: {meta[field]}\n"
+        products_info.append(content)
+    return "\n".join(products_info)
+
+
+def _staged_candidates(
+    type_key: str,
+    index: CatalogIndex,
+    main_query_lower: str,
+    staged: bool,
+    price_max: Optional[float],
+    recommendation_config: RecommendationConfig,
+    brands: Optional[List[str]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Narrow the cached catalog down field by field with TF-IDF + fuzzy scores; returns (positions, scores).
+    Preferred brands that match the catalog exactly select the candidates through the brand
+    posting lists when they can fill the result list and the query does not ask for another
+    brand; otherwise brands only get the fuzzy boost.
+    """
+    print(f"\n>>> Processing recommendations for type: {type_key} ({len(index)} points)")
+
+    max_price = price_max * 1.2 if price_max else None
+    query_brands = set(main_query_lower.split()) & set(index.by_brand)
+    narrow = bool(brands) and query_brands <= set(brands)
+    ids = index.select(max_price=max_price, brands=brands) if narrow else None
+    if ids is None or len(ids) < recommendation_config.get_max_results(type_key):
+        ids = index.select(max_price=max_price)
+    scores = np.zeros(len(ids))
+    print(f"Starting with {len(ids)} candidates after basic filtering")
+
+    if staged:
+        field_relevance = determine_field_relevance(main_query_lower, index, TEXT_FIELDS)
+        print(f"Field relevance ranking: {field_relevance}")
+
+        function = partial_ratio if len(main_query_lower.split()) < 5 else token_sort_ratio
+        for stage_idx, (field, relevance_score) in enumerate(field_relevance):
+            if len(ids) <= 5:
+                break
+
+            print(f"Stage {stage_idx + 1}: Filtering by '{field}' (relevance: {relevance_score:.2f})")
+            
+            similarities = calculate_similarities_batch(main_query_lower, index, ids, field)
+            column = index.text[field]
+            field_values = [column[i] for i in ids]
+            has_value = np.array([bool(value) for value in field_values], dtype=bool)
+            fuzzy_scores = process.cdist(
+                [main_query_lower],
+                field_values,
+                scorer=function,
+                workers=recommendation_config.FUZZY_WORKERS
+            )[0]
+            fuzzy_scores = np.where(has_value, fuzzy_scores, 0.0)
+            cosine_scores = np.where(has_value, similarities, 0.0)
+
+            combined_scores = (
+                fuzzy_scores * recommendation_config.FUZZY_WEIGHT + 
+                cosine_scores * 100 * recommendation_config.COSINE_WEIGHT
+            )
 
-        for key in merged_preferences:
-            if isinstance(merged_preferences[key], set):
-                merged_preferences[key] = list(merged_preferences[key])
-                
-        return merged_preferences
-        
-    finally:
-        db.close()
+            order = np.argsort(-combined_scores, kind="stable")
+
+            keep_ratio = [0.80, 0.65, 0.50, 0.35]
+            keep_count = max(5, int(len(order) * keep_ratio[min(stage_idx, 3)]))
+            kept = order[:keep_count]
+
+            ids = ids[kept]
+            scores = scores[kept] + combined_scores[kept] * relevance_score * (1.0 / (stage_idx + 1))
+
+            print(f"After stage {stage_idx + 1}: {len(ids)} candidates remaining")
+
+    return ids, scores
+
+
+def _hybrid_candidates(
+    main_query_lower: str,
+    type: Optional[str],
+    price_max: Optional[float],
+    recommendation_config: RecommendationConfig
+) -> Dict[str, Tuple[CatalogIndex, np.ndarray, np.ndarray]]:
+    """
+    Let Qdrant rank the catalog: one filtered vector search returns the top-K hits,
+    which are wrapped in a small CatalogIndex (no text models) for boosting and formatting.
+    """
+    type_key = type if type in VALID_TYPES else "get_all"
+    hits = search_catalog(
+        main_query_lower,
+        type=type_key,
+        max_price=price_max * 1.2 if price_max else None,
+        limit=recommendation_config.HYBRID_TOP_K
+    )
+    print(f"\n>>> Hybrid search for type: {type_key} returned {len(hits)} hits")
+
+    index = CatalogIndex(hits, text_fields=[])
+    scores = np.array([hit.score for hit in hits], dtype=float) * recommendation_config.HYBRID_SIMILARITY_WEIGHT
+    return {type_key: (index, np.arange(len(hits)), scores)}
 
 
 @tool("recommend_system", args_schema=RecommendSystem)
@@ -63,7 +214,8 @@ def recommend_system(
     user_input: str,
     type :str = None,
     user_id: str = None,
-    price: str = None
+    price: str = None,
+    config: RunnableConfig = None
 ) -> Tuple[str, list[str]]: 
     """
     Recommend products based on user input, type , preferences, and history.
@@ -78,27 +230,11 @@ def recommend_system(
         global_config: Global config that may contain recommended devices for persistence
     """
     recommendation_config = RecommendationConfig()
-    db = get_shop_db()
-    
-    try:
-        user = db.query(CustomerInfo).filter(CustomerInfo.user_id == user_id).first()
-        preference = json.loads(user.preferences) if user and user.preferences else None
-    finally:
-        db.close()
     main_query_lower = user_input.lower() if user_input else ""
 
-    all_points_dict = get_all_points(type=type)
-
-    # Merge preferences
-    merged_pref = defaultdict(set)
-    age_pref = get_other_preference(user_id)
-    for source in [preference, age_pref]:
-        for k, v in source.items():
-            if isinstance(v, list):
-                merged_pref[k].update(map(str.lower, v))
-            else:
-                merged_pref[k].add(str(v).lower())
-    preference = {k: list(v) for k, v in merged_pref.items()}
+    # User + age-cohort preferences, loaded once per conversation
+    conversation_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    preference = load_user_preferences(user_id, conversation_id)
 
     # Brand handling
     has_brands = False
@@ -117,6 +253,12 @@ def recommend_system(
     # Price handling
     price_input = [price] if price else []
     has_price_input = bool(price_input)
+    price_number = None
+    if has_price_input:
+        try:
+            price_number = float(price_input[0])
+        except (ValueError, TypeError):
+            price_number = None
 
     price_min = price_max = None
     price_range = preference.get("price_range", []) if preference else []
@@ -132,240 +274,72 @@ def recommend_system(
             price_min = min(numeric_prices)
             price_max = max(numeric_prices)
 
-    text_fields = [
-        "device_name", "cpu", "card", "brand", "battery", 
-        "storage", "discount_percent", "sales_price", "guarantee_program"
-    ]
+    # Repeated questions are answered from the result cache while the catalog is unchanged
+    version = catalog_version(type)
+    if version:
+        cached = get_cached_result(
+            result_cache_key(user_input, type, price, preference, recommendation_config.ENGINE, version)
+        )
+        if cached is not None:
+            print(f"Recommendation served from cache ({len(cached[1])} products)")
+            return cached
+
+    catalog = None
+    # While the catalog is cold (catalog_version queued its load in the background) the
+    # query is answered by Qdrant's search rather than a full scroll on this thread
+    cold_fallback = recommendation_config.ENGINE != "hybrid" and not version
+    if (recommendation_config.ENGINE == "hybrid" or cold_fallback) and main_query_lower:
+        try:
+            catalog = _hybrid_candidates(main_query_lower, type, price_max, recommendation_config)
+        except Exception as e:
+            print(f"Hybrid search failed, falling back to staged ranking: {e}")
+    # Search results from a cold catalog are not what the staged engine would have returned
+    cacheable = not (cold_fallback and catalog is not None)
+    if catalog is None:
+        staged = type != "get_all"
+        catalog = {
+            type_key: (index, *_staged_candidates(
+                type_key, index, main_query_lower, staged, price_max, recommendation_config, brands if has_brands else None
+            ))
+            for type_key, index in get_catalog_index(type=type).items()
+        }
 
     final_results = {}  
     final_text_blocks = []
 
-    if type == "get_all":
-        for type_key, points_list in all_points_dict.items():
-            print(f"\n>>> Processing get_all recommendations for type: {type_key} ({len(points_list)} points)")
-            candidates = [{"doc": doc, "score": 0} for doc in points_list]
-
-            if price_max:
-                candidates = [
-                    candidate for candidate in candidates
-                    if isinstance(candidate["doc"].payload.get("metadata", {}).get("sale_price"), (int, float))
-                    and candidate["doc"].payload.get("metadata", {}).get("sale_price") <= price_max * 1.2
-                ]
-
-            for candidate in candidates:
-                meta = candidate["doc"].payload.get("metadata", {})
-                sale_price = meta.get("sale_price")
-
-                if has_brands:
-                    doc_brand = meta.get("brand", "").lower()
-                    best_match = process.extractOne(doc_brand, brands, scorer=partial_ratio)
-                    best_brand_score = best_match[1] if best_match else 0
-
-                    if best_brand_score >= 90:
-                        candidate["score"] += recommendation_config.BRAND_MATCH_STRONG
-                    elif best_brand_score >= 75:
-                        candidate["score"] += recommendation_config.BRAND_MATCH_MEDIUM
-                    elif best_brand_score >= 50:
-                        candidate["score"] += recommendation_config.BRAND_MATCH_WEAK
-                    else:
-                        candidate["score"] += recommendation_config.BRAND_MISMATCH_PENALTY
-
-                if has_price_input:
-                    try:
-                        price_number = float(price_input[0])
-                        price_diff = abs(sale_price - price_number) / price_number
-                        price_similarity = max(0, 1 - price_diff)
-                        candidate["score"] += price_similarity * recommendation_config.PRICE_RANGE_MATCH_BOOST
-                    except:
-                        pass
-                elif has_price:
-                    if isinstance(sale_price, (int, float)):
-                        if price_min is not None and price_max is not None and price_min <= sale_price <= price_max:
-                            candidate["score"] += recommendation_config.PRICE_RANGE_MATCH_BOOST
-                        elif price_max is not None and sale_price <= price_max:
-                            candidate["score"] += recommendation_config.PRICE_RANGE_MATCH_BOOST * 0.7
-                        elif price_min is not None and sale_price >= price_min:
-                            candidate["score"] += recommendation_config.PRICE_RANGE_MATCH_BOOST * 0.7
-
-            top_match_count = min(recommendation_config.get_max_results(type_key), len(candidates))
-            top_matches = heapq.nlargest(top_match_count, candidates, key=lambda x: x["score"])
-
-            top_device_names = []
-            for match in top_matches:
-                device_name = match["doc"].payload.get("metadata", {}).get("device_name")
-                if device_name:
-                    top_device_names.append(device_name)
-
-            final_results[type_key] = top_device_names
-
-            if top_matches:
-                meta_fields = [
-                    "device_name", "cpu", "card", "screen", "storage", "image_link",
-                    "sale_price", "discount_percent", "installment_price", "sales_perks", 
-                    "guarantee_program", "payment_perks", "source"
-                ]
-                products_info = []
-                for idx, item in enumerate(top_matches, start=1):
-                    meta = item["doc"].payload.get("metadata", {})
-                    content = f"Product {idx} (Score: {item['score']:.2f}) [{type_key}]:\n"
-                    for field in meta_fields:
-                        if field in meta and meta[field]:
-                            if field in ["sale_price", "installment_price"]:
-                                value = meta[field]
-                                if isinstance(value, (int, float)):
-                                    content += f"- {field}: {value:,} VND\n"
-                                else:
-                                    content += f"- {field}: {value} VND\n"
-                            elif field == "discount_percent":
-                                content += f"- {field}: {meta[field]}%\n"
-                            else:
-                                content += f"- {field}: {meta[field]}\n"
-                    products_info.append(content)
-                final_text_blocks.append("\n".join(products_info))
-
-        if not any(final_results.values()):
-            return "I couldn't find any products matching your preferences.", []
-        recommended_devices_cache = [d for devices in final_results.values() for d in devices]
-        search_context = "\n\n".join(final_text_blocks)
-        return search_context, recommended_devices_cache
-    
-    else:
-        for type_key, points_list in all_points_dict.items():
-            print(f"\n>>> Processing recommendations for type: {type_key} ({len(points_list)} points)")
+    for type_key, (index, ids, scores) in catalog.items():
+        if has_brands:
+            scores += _brand_boosts(index, ids, brands, recommendation_config)
+        scores += _price_boosts(
+            index, ids, has_price_input, price_number, has_price, price_min, price_max, recommendation_config
+        )
 
-            field_relevance = determine_field_relevance(main_query_lower, points_list, text_fields)
-            print(f"Field relevance ranking: {field_relevance}")
+        top_match_count = min(recommendation_config.get_max_results(type_key), len(ids))
+        top_order = np.argsort(-scores, kind="stable")[:top_match_count]
+        top_ids = ids[top_order]
+        top_scores = scores[top_order]
 
-            candidates = [{"doc": doc, "score": 0} for doc in points_list]
+        final_results[type_key] = [name for name in (index.device_name(i) for i in top_ids) if name]
 
-            if price_max:
-                candidates = [
-                    candidate for candidate in candidates
-                    if isinstance(candidate["doc"].payload.get("metadata", {}).get("sale_price"), (int, float))
-                    and candidate["doc"].payload.get("metadata", {}).get("sale_price") <= price_max * 1.2
-                ]
+        if len(top_ids):
+            final_text_blocks.append(_format_products(index, top_ids, top_scores, type_key))
 
-            print(f"Starting with {len(candidates)} candidates after basic filtering")
+    if not any(final_results.values()):
+        if type == "get_all":
+            return "I couldn't find any products matching your preferences.", []
+        return "I couldn't find any products matching your criteria. Could you provide more specific details?", []
 
-            for stage_idx, (field, relevance_score) in enumerate(field_relevance):
-                if len(candidates) <= 5:
-                    break
+    search_context = "\n\n".join(final_text_blocks)
+    recommended_devices_cache = [d for devices in final_results.values() for d in devices]
 
-                print(f"Stage {stage_idx + 1}: Filtering by '{field}' (relevance: {relevance_score:.2f})")
-                
-                similarities = calculate_similarities_batch(main_query_lower, candidates, field)
-                
-                field_scores = []
-                for i, candidate in enumerate(candidates):
-                    meta = candidate["doc"].payload.get("metadata", {})
-                    field_value = convert_to_string(meta.get(field, ""))
-                    
-                    if not field_value:
-                        fuzzy_score = 0
-                        cosine_score = 0
-                    else:
-                        function = partial_ratio if len(main_query_lower.split()) < 5 else token_sort_ratio
-                        fuzzy_score = function(main_query_lower, field_value.lower())
-                        cosine_score = similarities.get(i, 0)
-                    
-                    combined_score = (
-                        fuzzy_score * recommendation_config.FUZZY_WEIGHT + 
-                        cosine_score * 100 * recommendation_config.COSINE_WEIGHT
-                    )
-                    field_scores.append((candidate, combined_score))
-
-                field_scores.sort(key=lambda x: x[1], reverse=True)
-
-                keep_ratio = [0.80, 0.65, 0.50, 0.35]
-                keep_count = max(5, int(len(field_scores) * keep_ratio[min(stage_idx, 3)]))
-
-                candidates = []
-                for i, (candidate, field_score) in enumerate(field_scores[:keep_count]):
-                    candidate["score"] += field_score * relevance_score * (1.0 / (stage_idx + 1))
-                    candidates.append(candidate)
-
-                print(f"After stage {stage_idx + 1}: {len(candidates)} candidates remaining")
-
-            for candidate in candidates:
-                meta = candidate["doc"].payload.get("metadata", {})
-                sale_price = meta.get("sale_price")
-
-                if has_brands:
-                    doc_brand = meta.get("brand", "").lower()
-                    best_match = process.extractOne(doc_brand, brands, scorer=partial_ratio)
-                    best_brand_score = best_match[1] if best_match else 0
-
-                    if best_brand_score >= 90:
-                        candidate["score"] += recommendation_config.BRAND_MATCH_STRONG
-                    elif best_brand_score >= 75:
-                        candidate["score"] += recommendation_config.BRAND_MATCH_MEDIUM
-                    elif best_brand_score >= 50:
-                        candidate["score"] += recommendation_config.BRAND_MATCH_WEAK
-                    else:
-                        candidate["score"] += recommendation_config.BRAND_MISMATCH_PENALTY
-
-                if has_price_input:
-                    try:
-                        price_number = float(price_input[0])
-                        price_diff = abs(sale_price - price_number) / price_number
-                        price_similarity = max(0, 1 - price_diff)
-                        candidate["score"] += price_similarity * recommendation_config.PRICE_RANGE_MATCH_BOOST
-                    except:
-                        pass
-                elif has_price:
-                    if isinstance(sale_price, (int, float)):
-                        if price_min is not None and price_max is not None and price_min <= sale_price <= price_max:
-                            candidate["score"] += recommendation_config.PRICE_RANGE_MATCH_BOOST
-                        elif price_max is not None and sale_price <= price_max:
-                            candidate["score"] += recommendation_config.PRICE_RANGE_MATCH_BOOST * 0.7
-                        elif price_min is not None and sale_price >= price_min:
-                            candidate["score"] += recommendation_config.PRICE_RANGE_MATCH_BOOST * 0.7
-
-            top_match_count = min(recommendation_config.get_max_results(type_key), len(candidates))
-            top_matches = heapq.nlargest(top_match_count, candidates, key=lambda x: x["score"])
-
-            top_device_names = []
-            for match in top_matches:
-                device_name = match["doc"].payload.get("metadata", {}).get("device_name")
-                if device_name:
-                    top_device_names.append(device_name)
-
-            final_results[type_key] = top_device_names
-
-            if top_matches:
-                meta_fields = [
-                    "device_name", "cpu", "card", "screen", "storage", "image_link",
-                    "sale_price", "discount_percent", "installment_price", "sales_perks", 
-                    "guarantee_program", "payment_perks", "source"
-                ]
-
-                products_info = []
-                for idx, item in enumerate(top_matches, start=1):
-                    meta = item["doc"].payload.get("metadata", {})
-                    content = f"Product {idx} (Score: {item['score']:.2f}) [{type_key}]:\n"
-                    for field in meta_fields:
-                        if field in meta and meta[field]:
-                            if field in ["sale_price", "installment_price"]:
-                                value = meta[field]
-                                if isinstance(value, (int, float)):
-                                    content += f"- {field}: {value:,} VND\n"
-                                else:
-                                    content += f"- {field}: {value} VND\n"
-                            elif field == "discount_percent":
-                                content += f"- {field}: {meta[field]}%\n"
-                            else:
-                                content += f"- {field}: {meta[field]}\n"
-                    products_info.append(content)
-                final_text_blocks.append("\n".join(products_info))
-
-        if not any(final_results.values()):
-            return "I couldn't find any products matching your criteria. Could you provide more specific details?", []
-
-        search_context = "\n\n".join(final_text_blocks)
-        recommended_devices_cache = [d for devices in final_results.values() for d in devices]
-
-        print(f"Recommendation completed. Found {len(recommended_devices_cache)} products across {len(final_results)} type(s).")
-        return search_context, recommended_devices_cache
+    print(f"Recommendation completed. Found {len(recommended_devices_cache)} products across {len(final_results)} type(s).")
+    version = version or catalog_version(type)
+    if version and cacheable:
+        store_result(
+            result_cache_key(user_input, type, price, preference, recommendation_config.ENGINE, version),
+            (search_context, recommended_devices_cache)
+        )
+    return search_context, recommended_devices_cache
 
 
 @tool("device_details")
@@ -404,20 +378,17 @@ def get_device_details(user_input: str, top_device_names: Optional[List[str]] =
         if not device_names or len(device_names) == 0:
             return "No recommended devices available. Please search for devices first."
 
-        scored_devices = [
-            (rec_device, partial_ratio(user_input.lower(), rec_device.lower()))
-            for rec_device in device_names
-        ]
-
-        top_device, top_score = max(scored_devices, key=lambda x: x[1])
+        # Normalize the candidate list once; extractOne then scores it in a single pass
+        originals = {}
+        for name in device_names:
+            originals.setdefault(normalize_name(name), name)
+        best_match = process.extractOne(normalize_name(user_input), list(originals), scorer=partial_ratio)
+        if not best_match:
+            return "No recommended devices available. Please search for devices first."
+        top_device, top_score = originals[best_match[0]], best_match[1]
         print(f"Top matched device: {top_device} (score: {top_score})")
 
-        all_points = get_all_points()
-        matching_doc = next(
-            (doc for doc in all_points
-            if doc.payload.get("metadata", {}).get("device_name", "").lower() == top_device.lower()),
-            None
-        )
+        matching_doc = find_device(top_device)
 
         if not matching_doc:
             return f"No detailed information found for '{top_device}'. Please try another product."
@@ -1,26 +1,42 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from rapidfuzz.fuzz import partial_ratio
-from typing import List
+from typing import Callable, List, Dict, Optional
 from qdrant_client import QdrantClient
+import threading
 import time
+from functools import lru_cache
+import numpy as np
 from qdrant_client.http import models
 
 from config.base_config import APP_CONFIG
+from factories.embedding_factory import create_embedding_model
+from .catalog_index import CatalogIndex, tokenize, normalize_name
 from utils.logging.logger import get_logger
 logger = get_logger(__name__)
 
 QDRANT_URL = APP_CONFIG.recommend_config.url
 QDRANT_API_KEY = APP_CONFIG.recommend_config.api_key
 COLLECTION = APP_CONFIG.recommend_config.collection_name
+SHOP_COLLECTION = "FPT_SHOP"
+VALID_TYPES = {"phone", "laptop/pc", "earphone", "mouse", "keyboard"}
 
 
 # Global variables for caching
-_vectorizer = None
-_cached_all_points = None
-_cache_timestamp = 0
 _client_cache = None
+_embedding_cache = None
+_QUERY_EMBEDDING_CACHE_SIZE = 512
 _CACHE_TTL = 300  # 5 minutes in seconds
+_PREFETCH_MARGIN = 60  # refresh entries this long before they expire
+_FULL_RESYNC_INTERVAL = 3600  # periodic full scroll, drops points deleted upstream
+_REFRESHER_INTERVAL = 15
+
+_entries: Dict[str, "_CatalogEntry"] = {}
+_entries_lock = threading.Lock()
+_refresher_thread: Optional[threading.Thread] = None
+_refresher_wakeup = threading.Event()
+_refresh_listeners: List[Callable[[str], None]] = []
+TIME_UPDATE_FIELD = "metadata.time_update"
+# Set by the refresher once the datetime index exists; until then every refresh is a full scroll
+_time_update_indexed = False
+_time_update_checked_at = 0.0
 
 
 def get_client():
@@ -34,155 +50,371 @@ def get_client():
     return _client_cache
 
 
+def get_embedding_model():
+    """Get the cached embedding model used to encode recommendation queries."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = create_embedding_model(APP_CONFIG.embedding_model_config)
+    return _embedding_cache
+
+
+@lru_cache(maxsize=_QUERY_EMBEDDING_CACHE_SIZE)
+def _embed_query(query: str) -> tuple:
+    return tuple(get_embedding_model().embed_query(query))
+
+
+def search_catalog(query: str, type: str = "get_all", max_price: Optional[float] = None, limit: int = 40) -> list:
+    """
+    Rank catalog points against the query with a Qdrant vector search.
+
+    The query is embedded once (repeated queries reuse the cached vector) and the
+    category and sale_price constraints are pushed down as payload filters, so only
+    the top `limit` hits ever leave Qdrant.
+    """
+    conditions: List[models.Condition] = []
+    if type in VALID_TYPES:
+        conditions.append(models.FieldCondition(key="metadata.category", match=models.MatchValue(value=type)))
+    if max_price is not None:
+        conditions.append(models.FieldCondition(key="metadata.sale_price", range=models.Range(lte=max_price)))
+
+    response = get_client().query_points(
+        collection_name=SHOP_COLLECTION,
+        query=list(_embed_query(query)),
+        query_filter=models.Filter(must=conditions) if conditions else None,
+        limit=limit,
+        with_payload=True,
+        with_vectors=False
+    )
+    return response.points
+
+
 def convert_to_string(value) -> str:
     """Convert any value to a string in a standardized way."""
     if isinstance(value, list):
         return " ".join(str(item) for item in value)
     return str(value)
 
-def calculate_similarities_batch(main_query: str, candidates: list, field: str) -> dict:
-    """Calculate similarities for all candidates at once."""
-    field_values = []
-    candidate_ids = []
-    
-    for i, candidate in enumerate(candidates):
-        meta = candidate["doc"].payload.get("metadata", {})
-        field_value = convert_to_string(meta.get(field, ""))
-        field_values.append(field_value if field_value else "")
-        candidate_ids.append(i)
-    
-    if not field_values:
-        return {i: 0.0 for i in candidate_ids}
-    
-    corpus = [main_query] + field_values
-    vectorizer = TfidfVectorizer()
-    
+def calculate_similarities_batch(main_query: str, index: CatalogIndex, candidate_ids: np.ndarray, field: str) -> np.ndarray:
+    """
+    Cosine similarity between the query and each candidate's field value, aligned with candidate_ids.
+    Uses the TF-IDF model fitted for this field when the cache entry was built, so a query
+    costs one transform and a sparse dot product.
+    """
+    model = index.tfidf.get(field)
+    if model is None or len(candidate_ids) == 0:
+        return np.zeros(len(candidate_ids))
+
+    vectorizer, matrix = model
     try:
-        vectors = vectorizer.fit_transform(corpus)
-        similarities = cosine_similarity(vectors[0], vectors[1:])[0]
-        return {candidate_ids[i]: float(similarities[i]) for i in range(len(candidate_ids))}
+        query_vector = vectorizer.transform([main_query])
+        return (matrix[candidate_ids] @ query_vector.T).toarray().ravel()
     except Exception as e:
         print(f"Similarity calculation failed: {e}")
-        return {i: 0.0 for i in candidate_ids}
-    
-def get_all_points(batch_size: int = 150, force_refresh: bool = False, type: str = "get_all") -> dict:
+        return np.zeros(len(candidate_ids))
+
+
+class _CatalogEntry:
     """
-    Retrieve all points from Qdrant, always returning a dictionary {type: points_list}.
-    If type is 'get_all' or invalid, returns {"get_all": [...]} with no filtering.
+    Cached points and index of one category (or "get_all"), with its own TTL.
+
+    Readers only ever see a fully built (points, index) pair; refreshes build
+    the replacement off to the side and swap it in.
     """
-    global _cache_timestamp
 
-    current_time = time.time()
-    cache_expired = (current_time - _cache_timestamp) > _CACHE_TTL
+    def __init__(self, key: str):
+        self.key = key
+        self.points: list = []
+        self.index: Optional[CatalogIndex] = None
+        self.points_by_id: Dict = {}
+        self.refreshed_at = 0.0
+        self.full_synced_at = 0.0
+        self.last_sync: Optional[str] = None  # newest metadata.time_update seen
+        self.lock = threading.RLock()
 
-    valid_types = {"phone", "laptop/pc", "earphone", "mouse", "keyboard"}
-    is_get_all = type == "get_all" or type not in valid_types
+    @property
+    def loaded(self) -> bool:
+        return self.index is not None
 
+    def age(self, now: Optional[float] = None) -> float:
+        return (now or time.time()) - self.refreshed_at
 
-    if is_get_all:
-        cache_key = "get_all"
-        if (hasattr(get_all_points, '_cache_by_type') and 
-            cache_key in get_all_points._cache_by_type and 
-            not cache_expired and not force_refresh):
-            return {cache_key: get_all_points._cache_by_type[cache_key]}
+    def category_filter(self) -> List[models.Condition]:
+        if self.key == "get_all":
+            return []
+        return [models.FieldCondition(key="metadata.category", match=models.MatchValue(value=self.key))]
 
-        try:
-            client = get_client()
-            offset = None
-            all_points = []
-            while True:
-                points, offset = client.scroll(
-                    collection_name="FPT_SHOP",
-                    scroll_filter=None,
-                    with_vectors=False,
-                    with_payload=True,
-                    limit=batch_size,
-                    offset=offset
+
+def _scroll(conditions: List[models.Condition], batch_size: int) -> list:
+    client = get_client()
+    scroll_filter = models.Filter(must=conditions) if conditions else None
+    offset = None
+    collected = []
+    while True:
+        points, offset = client.scroll(
+            collection_name=SHOP_COLLECTION,
+            scroll_filter=scroll_filter,
+            with_vectors=False,
+            with_payload=True,
+            limit=batch_size,
+            offset=offset
+        )
+        collected.extend(points)
+        if not points or offset is None:
+            break
+    return collected
+
+
+def ensure_time_update_index() -> bool:
+    """
+    Incremental refreshes filter TIME_UPDATE_FIELD with a DatetimeRange, which Qdrant
+    only serves efficiently from a datetime payload index. Create it when missing;
+    False (logged) when it cannot be confirmed.
+    """
+    client = get_client()
+    try:
+        current = (client.get_collection(SHOP_COLLECTION).payload_schema or {}).get(TIME_UPDATE_FIELD)
+        if current is not None and current.data_type == models.PayloadSchemaType.DATETIME:
+            return True
+        if current is not None:
+            logger.warning(
+                f"{TIME_UPDATE_FIELD} is indexed as {current.data_type}, not datetime; "
+                "catalog refreshes will use full scrolls"
+            )
+            return False
+        client.create_payload_index(
+            collection_name=SHOP_COLLECTION,
+            field_name=TIME_UPDATE_FIELD,
+            field_schema=models.PayloadSchemaType.DATETIME,
+            wait=True
+        )
+        logger.info(f"Created datetime payload index on {SHOP_COLLECTION}.{TIME_UPDATE_FIELD}")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not ensure the datetime index on {TIME_UPDATE_FIELD}, catalog refreshes will use full scrolls: {e}")
+        return False
+
+
+def _newest_time_update(points: list, current: Optional[str] = None) -> Optional[str]:
+    newest = current
+    for point in points:
+        value = (point.payload or {}).get("metadata", {}).get("time_update")
+        if isinstance(value, str) and (newest is None or value > newest):
+            newest = value
+    return newest
+
+
+def _refresh_entry(entry: _CatalogEntry, batch_size: int = 150, full: bool = False) -> None:
+    """
+    Refresh one entry. Incremental refreshes only fetch points whose time_update is
+    not older than the last sync (time_update has day granularity, so the boundary
+    day is re-read and merged by point id); a full scroll runs on first load and
+    every _FULL_RESYNC_INTERVAL to pick up deletions, and always while the
+    time_update index is not confirmed.
+    """
+    with entry.lock:
+        now = time.time()
+        full = (
+            full or not _time_update_indexed or not entry.loaded or entry.last_sync is None
+            or (now - entry.full_synced_at) > _FULL_RESYNC_INTERVAL
+        )
+
+        if not full:
+            try:
+                changed = _scroll(
+                    entry.category_filter() + [
+                        models.FieldCondition(key=TIME_UPDATE_FIELD, range=models.DatetimeRange(gte=entry.last_sync))
+                    ],
+                    batch_size
                 )
-                all_points.extend(points)
-                if not points or offset is None:
-                    break
+            except Exception as e:
+                logger.warning(f"Incremental refresh of '{entry.key}' failed, falling back to full scroll: {e}")
+                full = True
+
+        if full:
+            points = _scroll(entry.category_filter(), batch_size)
+            points_by_id = {point.id: point for point in points}
+            entry.full_synced_at = now
+            entry.last_sync = _newest_time_update(points)
+        else:
+            points_by_id = entry.points_by_id
+            updated = {
+                point.id: point for point in changed
+                if point.id not in points_by_id or points_by_id[point.id].payload != point.payload
+            }
+            if updated:
+                points_by_id = {**points_by_id, **updated}
+            entry.last_sync = _newest_time_update(changed, entry.last_sync)
+
+        if full or points_by_id is not entry.points_by_id:
+            points = list(points_by_id.values())
+            index = CatalogIndex(points)
+            entry.points_by_id = points_by_id
+            entry.points, entry.index = points, index
+            logger.info(f"Catalog cache '{entry.key}' rebuilt with {len(points)} points ({'full' if full else 'incremental'} refresh)")
+            _notify_refresh(entry.key)
+        entry.refreshed_at = now
 
-            if not hasattr(get_all_points, '_cache_by_type'):
-                get_all_points._cache_by_type = {}
 
-            get_all_points._cache_by_type[cache_key] = all_points
-            _cache_timestamp = current_time
-            print(f"Returning {len(all_points)} total points (no category filter)")
-            return {cache_key: all_points}
+def on_catalog_refresh(callback: Callable[[str], None]) -> None:
+    """Register a callback invoked with the entry key whenever a catalog index is rebuilt."""
+    if callback not in _refresh_listeners:
+        _refresh_listeners.append(callback)
 
+
+def _notify_refresh(key: str) -> None:
+    for callback in list(_refresh_listeners):
+        try:
+            callback(key)
         except Exception as e:
-            print(f"Error: {e}")
-            return {cache_key: get_all_points._cache_by_type.get(cache_key, [])}
+            logger.warning(f"Catalog refresh listener failed for '{key}': {e}")
 
-    # Handle valid specific type
-    try:
-        client = get_client()
-        if not hasattr(get_all_points, '_cache_by_type'):
-            get_all_points._cache_by_type = {}
-
-        cache_key = type
-        if cache_key in get_all_points._cache_by_type and not cache_expired and not force_refresh:
-            return {cache_key: get_all_points._cache_by_type[cache_key]}
-
-        scroll_filter = models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="metadata.category",
-                    match=models.MatchValue(value=type)
-                )
-            ]
+
+def _get_entry(key: str) -> _CatalogEntry:
+    entry = _entries.get(key)
+    if entry is None:
+        with _entries_lock:
+            entry = _entries.setdefault(key, _CatalogEntry(key))
+    return entry
+
+
+def _refresher_loop(batch_size: int) -> None:
+    global _time_update_indexed, _time_update_checked_at
+    while True:
+        if not _time_update_indexed and time.time() - _time_update_checked_at > _FULL_RESYNC_INTERVAL:
+            # Checked here rather than at import so a slow or unreachable Qdrant never delays startup
+            _time_update_checked_at = time.time()
+            _time_update_indexed = ensure_time_update_index()
+        _refresher_wakeup.wait(_REFRESHER_INTERVAL)
+        _refresher_wakeup.clear()
+        now = time.time()
+        for entry in list(_entries.values()):
+            if entry.loaded and entry.age(now) < _CACHE_TTL - _PREFETCH_MARGIN:
+                continue
+            try:
+                _refresh_entry(entry, batch_size)
+            except Exception as e:
+                logger.error(f"Background refresh of catalog '{entry.key}' failed: {e}")
+
+
+def start_catalog_refresher(batch_size: int = 150, warm: bool = True) -> None:
+    """
+    Start the background refresher (once per process). With warm=True every
+    category and "get_all" is registered so the first load also happens off the
+    request path.
+    """
+    global _refresher_thread
+    with _entries_lock:
+        if _refresher_thread is not None and _refresher_thread.is_alive():
+            return
+        if warm:
+            for key in VALID_TYPES | {"get_all"}:
+                _entries.setdefault(key, _CatalogEntry(key))
+        _refresher_thread = threading.Thread(
+            target=_refresher_loop, args=(batch_size,), name="catalog-refresher", daemon=True
         )
+        _refresher_thread.start()
+    _refresher_wakeup.set()
 
-        offset = None
-        type_points = []
-        while True:
-            points, offset = client.scroll(
-                collection_name="FPT_SHOP",
-                scroll_filter=scroll_filter,
-                with_vectors=False,
-                with_payload=True,
-                limit=batch_size,
-                offset=offset
-            )
-            type_points.extend(points)
-            if not points or offset is None:
-                break
 
-        get_all_points._cache_by_type[cache_key] = type_points
-        _cache_timestamp = current_time
-        print(f"Found {len(type_points)} points for category '{type}'")
-        return {cache_key: type_points}
+def get_all_points(batch_size: int = 150, force_refresh: bool = False, type: str = "get_all") -> dict:
+    """
+    Retrieve all points from Qdrant, always returning a dictionary {type: points_list}.
+    If type is 'get_all' or invalid, returns {"get_all": [...]} with no filtering.
+
+    Each type is cached separately. Once an entry is loaded, requests are served
+    from memory and expiring entries are refreshed in the background; only the
+    very first load of an entry (or force_refresh) runs on the caller's thread.
+    """
+    cache_key = type if type in VALID_TYPES else "get_all"
+    entry = _get_entry(cache_key)
+    start_catalog_refresher(batch_size, warm=False)
 
+    try:
+        if force_refresh:
+            _refresh_entry(entry, batch_size)
+        elif not entry.loaded:
+            # Concurrent cold callers wait for the one in-flight load instead of scrolling again
+            with entry.lock:
+                if not entry.loaded:
+                    _refresh_entry(entry, batch_size, full=True)
     except Exception as e:
         print(f"Error: {e}")
-        return {type: get_all_points._cache_by_type.get(type, [])}
 
-import random
-def determine_field_relevance(query: str, all_points: list, text_fields: list) -> list:
+    if entry.loaded and entry.age() > _CACHE_TTL - _PREFETCH_MARGIN:
+        _refresher_wakeup.set()
+
+    return {cache_key: entry.points}
+
+
+def get_catalog_index(type: str = "get_all", force_refresh: bool = False) -> Dict[str, CatalogIndex]:
+    """
+    Return the catalog index for the requested type, shaped like get_all_points: {type: CatalogIndex}.
+    The index is rebuilt whenever the underlying points change.
+    """
+    cache_key = type if type in VALID_TYPES else "get_all"
+    get_all_points(force_refresh=force_refresh, type=type)
+    entry = _get_entry(cache_key)
+    return {cache_key: entry.index if entry.index is not None else CatalogIndex([])}
+
+
+def catalog_version(type: str = "get_all", warm: bool = True) -> Optional[str]:
+    """
+    Fingerprint of the loaded catalog entry for `type`; None while the entry is still cold.
+    With warm=True a cold entry is handed to the background refresher, so callers that
+    never load the index themselves (the hybrid engine) get a version shortly after.
+    """
+    cache_key = type if type in VALID_TYPES else "get_all"
+    entry = _entries.get(cache_key)
+    if entry is None or entry.index is None:
+        if warm:
+            _get_entry(cache_key)
+            start_catalog_refresher(warm=False)
+        return None
+    return entry.index.fingerprint
+
+
+def find_device(device_name: str):
+    """
+    Return the catalog point for a device name.
+
+    Looks the normalized name up in the name index of every loaded cache entry, so
+    it never triggers a collection scroll. Only if no entry knows the device does
+    it fall back to a small full-text filtered query on metadata.device_name.
+    """
+    for entry in list(_entries.values()):
+        if entry.index is not None:
+            point = entry.index.find_by_name(device_name)
+            if point is not None:
+                return point
+
+    try:
+        points, _ = get_client().scroll(
+            collection_name=SHOP_COLLECTION,
+            scroll_filter=models.Filter(must=[
+                models.FieldCondition(key="metadata.device_name", match=models.MatchText(text=device_name))
+            ]),
+            with_vectors=False,
+            with_payload=True,
+            limit=10
+        )
+    except Exception as e:
+        logger.error(f"Device lookup for '{device_name}' failed: {e}")
+        return None
+
+    wanted = normalize_name(device_name)
+    return next(
+        (point for point in points if normalize_name(point.payload.get("metadata", {}).get("device_name")) == wanted),
+        None
+    )
+
+
+def determine_field_relevance(query: str, index: CatalogIndex, text_fields: list) -> list:
     """
     Determine which fields are most relevant to the user query.
     Returns list of (field_name, relevance_score) tuples sorted by relevance.
+
+    Looks the query tokens up in the per-field vocabularies built with the index;
+    results are memoized per normalized query on the index of each category.
     """
-    field_relevance = {}
-    
-    for field in text_fields:
-        sample_size = min(50, len(all_points))
-        sample_docs = random.sample(all_points, sample_size)
-        
-        field_scores = []
-        for doc in sample_docs:
-            meta = doc.payload.get("metadata", {})
-            field_value = convert_to_string(meta.get(field, ""))
-            
-            if field_value:
-                score = partial_ratio(query, field_value.lower())
-                field_scores.append(score)
-        
-        if field_scores:
-            avg_relevance = sum(field_scores) / len(field_scores)
-            field_relevance[field] = avg_relevance
-        else:
-            field_relevance[field] = 0
-    
-    return sorted(field_relevance.items(), key=lambda x: x[1], reverse=True)
\ No newline at end of file
+    normalized_query = " ".join(tokenize(query))
+    return list(index.field_relevance(normalized_query, tuple(text_fields)))
\ No newline at end of file
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from services.redis_caching import redis_caching
+from utils.logging.logger import get_logger
+from .catalog_index import tokenize
+from .get_score import VALID_TYPES, on_catalog_refresh
+
+logger = get_logger(__name__)
+
+RESULT_CACHE_MAX_ENTRIES = 1024
+RESULT_CACHE_TTL = 600
+RESULT_CACHE_KEY = "rec_result:{type}:{version}:{digest}"
+
+_results: "OrderedDict[str, Tuple[str, List[str]]]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """Canonical form of a shopping query: NFC, lowercased, punctuation and extra spaces dropped."""
+    if not query:
+        return ""
+    return " ".join(tokenize(unicodedata.normalize("NFC", query)))
+
+
+def preference_fingerprint(preference: Optional[Dict[str, List[str]]]) -> str:
+    """Order-independent hash of the merged preference dict."""
+    canonical = {
+        key: sorted(map(str, value)) if isinstance(value, (list, set, tuple)) else str(value)
+        for key, value in (preference or {}).items()
+    }
+    return hashlib.blake2b(json.dumps(canonical, sort_keys=True).encode(), digest_size=12).hexdigest()
+
+
+def result_cache_key(
+    query: Optional[str],
+    type: Optional[str],
+    price: Optional[str],
+    preference: Optional[Dict[str, List[str]]],
+    engine: str,
+    version: str
+) -> str:
+    type_key = type if type in VALID_TYPES else "get_all"
+    digest = hashlib.blake2b(
+        "\x1f".join([engine, normalize_query(query), str(price or "").strip(), preference_fingerprint(preference)]).encode(),
+        digest_size=16
+    ).hexdigest()
+    return RESULT_CACHE_KEY.format(type=type_key, version=version, digest=digest)
+
+
+def get_cached_result(key: str) -> Optional[Tuple[str, List[str]]]:
+    """Look the key up in process first, then in Redis (promoting Redis hits into the local LRU)."""
+    with _results_lock:
+        cached = _results.get(key)
+        if cached is not None:
+            _results.move_to_end(key)
+            return cached
+
+    client = redis_caching()
+    if not client:
+        return None
+    try:
+        raw = client.get(key)
+    except Exception as e:
+        logger.warning(f"Failed to read recommendation cache {key}: {e}")
+        return None
+    if raw is None:
+        return None
+
+    search_context, devices = json.loads(raw)
+    result = (search_context, devices)
+    _remember(key, result)
+    return result
+
+
+def store_result(key: str, result: Tuple[str, List[str]]) -> None:
+    _remember(key, result)
+    client = redis_caching()
+    if not client:
+        return
+    try:
+        client.set(key, json.dumps(list(result), ensure_ascii=False), ex=RESULT_CACHE_TTL)
+    except Exception as e:
+        logger.warning(f"Failed to write recommendation cache {key}: {e}")
+
+
+def _remember(key: str, result: Tuple[str, List[str]]) -> None:
+    with _results_lock:
+        _results[key] = result
+        _results.move_to_end(key)
+        while len(_results) > RESULT_CACHE_MAX_ENTRIES:
+            _results.popitem(last=False)
+
+
+def invalidate_results(type: Optional[str] = None) -> None:
+    """
+    Drop in-process results computed from one catalog entry (all of them when type is None).
+    Redis copies need no explicit delete: their keys carry the catalog fingerprint,
+    so a refreshed catalog never reads them again and they expire after RESULT_CACHE_TTL.
+    """
+    with _results_lock:
+        if type is None:
+            _results.clear()
+            return
+        prefix = f"rec_result:{type}:"
+        for key in [key for key in _results if key.startswith(prefix)]:
+            del _results[key]
+
+
+on_catalog_refresh(invalidate_results)
@@ -0,0 +1,59 @@
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from models.database import CustomerInfo, SessionLocal
+from services.preference_cohort import load_cohort_preferences
+
+# Preferences rarely change mid-conversation; re-read them at most this often
+USER_CONTEXT_TTL = 60
+USER_CONTEXT_MAX_ENTRIES = 2048
+
+_context_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, List[str]]]] = {}
+_context_lock = threading.Lock()
+
+
+def _merge_user_preferences(*sources: Optional[dict]) -> Dict[str, List[str]]:
+    """Merge preference dicts into lowercased value lists, as the recommender expects."""
+    merged_pref = defaultdict(set)
+    for source in sources:
+        for k, v in (source or {}).items():
+            if isinstance(v, list):
+                merged_pref[k].update(map(str.lower, v))
+            else:
+                merged_pref[k].add(str(v).lower())
+    return {k: list(v) for k, v in merged_pref.items()}
+
+
+def load_user_preferences(user_id: Optional[str], conversation_id: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Load the user's own preferences merged with their age cohort's.
+
+    One session and one SQL query fetch the user's preferences and age; the cohort
+    document then comes from the pre-merged Redis aggregate (SQL only on a miss, in
+    the same session). The result is memoized per conversation for USER_CONTEXT_TTL.
+    """
+    cache_key = (conversation_id or "", user_id or "")
+    now = time.time()
+    cached = _context_cache.get(cache_key)
+    if cached and now - cached[0] < USER_CONTEXT_TTL:
+        return cached[1]
+
+    db = SessionLocal()
+    try:
+        user = db.query(CustomerInfo.preferences, CustomerInfo.age).filter(CustomerInfo.user_id == user_id).first()
+        preference = json.loads(user.preferences) if user and user.preferences else None
+        age_pref = load_cohort_preferences(db, user.age) if user else {}
+    finally:
+        db.close()
+
+    merged = _merge_user_preferences(preference, age_pref)
+    with _context_lock:
+        if len(_context_cache) >= USER_CONTEXT_MAX_ENTRIES:
+            expired = [key for key, (stored_at, _) in _context_cache.items() if now - stored_at >= USER_CONTEXT_TTL]
+            for key in expired or list(_context_cache)[:USER_CONTEXT_MAX_ENTRIES // 4]:
+                _context_cache.pop(key, None)
+        _context_cache[cache_key] = (now, merged)
+    return merged
@@ -19,6 +19,21 @@ if not chat_config:
 else:
     llm = create_chat_model(chat_config)
 
+QUERY_PROMPT = PromptTemplate(
+    input_variables=["question", "context"],
+    template=(
+        "You are an AI assistant fluent in both Vietnamese and English.\n"
+        "ONLY use the provided context to answer the user's question.\n\n"
+        "always return image URLs if any\n\n"
+        "Context:\n{context}\n\n"
+        "Question:\n{question}"
+    )
+)
+
+# Compose the prompt with the model
+llm_chain: Runnable = QUERY_PROMPT | llm
+
+
 # Response generation function
 def get_context(context: str, user_question: str) -> str:
     """
@@ -31,20 +46,11 @@ def get_context(context: str, user_question: str) -> str:
     Returns:
         str: Response generated by the language model.
     """
-    QUERY_PROMPT = PromptTemplate(
-        input_variables=["question", "context"],
-        template=(
-            "You are an AI assistant fluent in both Vietnamese and English.\n"
-            "ONLY use the provided context to answer the user's question.\n\n"
-            "always return image URLs if any\n\n"
-            "Context:\n{context}\n\n"
-            "Question:\n{question}"
-        )
-    )
+    response = llm_chain.invoke({"question": user_question, "context": context})
+    return response.content if hasattr(response, "content") else str(response)
 
-    # Compose the prompt with the model
-    llm_chain: Runnable = QUERY_PROMPT | llm
 
-    # Run and return the response
-    response = llm_chain.invoke({"question": user_question, "context": context})
+async def aget_context(context: str, user_question: str) -> str:
+    """Async version of get_context."""
+    response = await llm_chain.ainvoke({"question": user_question, "context": context})
     return response.content if hasattr(response, "content") else str(response)
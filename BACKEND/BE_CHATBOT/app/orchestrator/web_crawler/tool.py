@@ -1,15 +1,36 @@
-from .llm import get_context
+from .llm import get_context, aget_context
 from .url import URLCrawler
 from .cache import store_url_content,  get_combined_content, get_all_cached_urls, clear_expired_cache
 from schemas.device_schemas import UrlExtraction
 import warnings
 warnings.filterwarnings('ignore')
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
 import asyncio
 from typing import List
 
-@tool("url_extraction", args_schema=UrlExtraction)
-def url_extraction(user_input: str, urls: List[str]) -> str:
+async def _collect_url_content(user_input: str, urls: List[str]) -> str:
+    """Crawl every URL concurrently (one crawler per URL, it keeps per-page state) and cache the results."""
+    results = await asyncio.gather(
+        *(URLCrawler().get_converted_document(single_url) for single_url in urls),
+        return_exceptions=True
+    )
+    all_content = []
+    for single_url, result in zip(urls, results):
+        try:
+            if isinstance(result, Exception):
+                raise result
+            content, _ = result
+            if content:
+                all_content.append(f"Content from {single_url}:\n{content}")
+                store_url_content(single_url, content, user_input)
+        except Exception as e:
+            all_content.append(f"Error extracting content from {single_url}: {str(e)}")
+
+    # Combine all content
+    return "\n\n---\n\n".join(all_content)
+
+
+def _url_extraction(user_input: str, urls: List[str]) -> str:
     """
     Extracts information from one or more URLs based on user input.
     
@@ -20,27 +41,25 @@ def url_extraction(user_input: str, urls: List[str]) -> str:
     Returns:
         The extracted information as a string
     """
-    crawler = URLCrawler()
-    all_content = []
-    for single_url in urls:
-        try:
-            # Crawl the URL
-            content, _ = asyncio.run(crawler.get_converted_document(single_url))
-            if content:
-                all_content.append(f"Content from {single_url}:\n{content}")
-                store_url_content(single_url, content, user_input)
-        except Exception as e:
-            all_content.append(f"Error extracting content from {single_url}: {str(e)}")
-    
-    # Combine all content
-    combined_content = "\n\n---\n\n".join(all_content)
-    
-    # If no content was retrieved
+    combined_content = asyncio.run(_collect_url_content(user_input, urls))
     if not combined_content:
         return "Unable to extract content from the provided URL(s). Please check if the URLs are valid."
-    
-    answer = get_context(combined_content, user_input)
-    return answer
+    return get_context(combined_content, user_input)
+
+
+async def _aurl_extraction(user_input: str, urls: List[str]) -> str:
+    combined_content = await _collect_url_content(user_input, urls)
+    if not combined_content:
+        return "Unable to extract content from the provided URL(s). Please check if the URLs are valid."
+    return await aget_context(combined_content, user_input)
+
+
+url_extraction = StructuredTool.from_function(
+    func=_url_extraction,
+    coroutine=_aurl_extraction,
+    name="url_extraction",
+    args_schema=UrlExtraction
+)
 
 @tool("url_followup")
 def url_followup(user_input: str) -> str:
@@ -11,3 +11,8 @@ class ChunkMessage(BaseModel):
     tools: Optional[List[Dict[str, Any]]] = None
     prompt_token: Optional[int] = None
     completion_token: Optional[int] = None
+    # AI message the streamed text belongs to
+    message_id: Optional[str] = None
+    # None for text; "discard": drop the text already received for message_id
+    # (a preamble to a tool call, or an attempt that was retried)
+    event: Optional[str] = None
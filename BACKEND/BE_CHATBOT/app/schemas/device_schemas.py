@@ -2,6 +2,9 @@ from pydantic import BaseModel,EmailStr,field_validator
 from typing import Annotated, Literal, Optional, List
 from datetime import datetime
 
+from config.config_loader import CONFIG
+from utils.utils import get_value_from_dict
+
 
 class CompleteOrEscalate(BaseModel):
     """A tool to return control to the main assistant when:
@@ -337,6 +340,11 @@ class RecommendationConfig:
     PRICE_RANGE_MATCH_BOOST = 25
     FUZZY_WEIGHT = 0.4
     COSINE_WEIGHT = 0.6
+    FUZZY_WORKERS = -1  # rapidfuzz cdist workers, -1 uses all cores
+    # "staged": in-process TF-IDF/fuzzy ranking, "hybrid": Qdrant vector search with metadata filters
+    ENGINE = get_value_from_dict("recommendation_config.engine", CONFIG or {}, default="staged")()
+    HYBRID_TOP_K = get_value_from_dict("recommendation_config.hybrid_top_k", CONFIG or {}, default=40)()
+    HYBRID_SIMILARITY_WEIGHT = 100
     @classmethod
     def get_max_results(cls, type_):
         if not type_:
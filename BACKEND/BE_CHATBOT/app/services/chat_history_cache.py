@@ -0,0 +1,90 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.redis_caching import async_redis_caching
+from utils.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+# History is a Redis stream (entry ids double as pagination cursors and SSE event ids);
+# live messages are published on a separate pub/sub channel per conversation
+CHAT_HISTORY_KEY = "chat_history:{conversation_id}"
+CHAT_CHANNEL = "chat:{conversation_id}"
+CHAT_HISTORY_MAX_MESSAGES = 100
+CHAT_HISTORY_TTL = 86400
+CHAT_HISTORY_PAGE_SIZE = 50
+
+# KEYS: stream, channel. ARGV: maxlen, ttl, then role/content pairs.
+# XADD assigns the id inside Redis, so the published copy carries the same id in one round trip.
+# Every pair is appended first, then published, then the TTL is refreshed once for the batch.
+_APPEND_SCRIPT = """
+local ids = {}
+for i = 3, #ARGV, 2 do
+    ids[#ids + 1] = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'role', ARGV[i], 'content', ARGV[i + 1])
+end
+for n, id in ipairs(ids) do
+    local i = 1 + 2 * n
+    redis.call('PUBLISH', KEYS[2], cjson.encode({id = id, role = ARGV[i], content = ARGV[i + 1]}))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return ids
+"""
+_append_script = None
+
+
+def chat_history_key(conversation_id: str) -> str:
+    return CHAT_HISTORY_KEY.format(conversation_id=conversation_id)
+
+
+def chat_channel(conversation_id: str) -> str:
+    return CHAT_CHANNEL.format(conversation_id=conversation_id)
+
+
+def stream_id_key(entry_id: str) -> Tuple[int, int]:
+    """Sortable form of a stream entry id ("<ms>-<seq>")."""
+    ms, _, seq = str(entry_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _to_message(entry_id: Any, fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": entry_id, "role": fields.get("role"), "content": fields.get("content")}
+
+
+async def append_messages(conversation_id: str, messages: Iterable[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Append (role, content) pairs to the conversation stream and publish them.
+
+    One script call per batch: an XADD per message (approximately capped at
+    CHAT_HISTORY_MAX_MESSAGES), a PUBLISH of each with its assigned id, and one
+    EXPIRE, run atomically in a single round trip. Returns the messages with
+    their stream ids.
+    """
+    global _append_script
+    pairs = [(role, content) for role, content in messages]
+    if not conversation_id or not pairs:
+        return []
+
+    client = async_redis_caching()
+    if _append_script is None:
+        _append_script = client.register_script(_APPEND_SCRIPT)
+    args: List[Any] = [CHAT_HISTORY_MAX_MESSAGES, CHAT_HISTORY_TTL]
+    for role, content in pairs:
+        args.extend([role, content])
+    ids = await _append_script(keys=[chat_history_key(conversation_id), chat_channel(conversation_id)], args=args, client=client)
+    return [{"id": entry_id, "role": role, "content": content} for entry_id, (role, content) in zip(ids, pairs)]
+
+
+async def append_message(conversation_id: str, role: str, content: str) -> Optional[Dict[str, Any]]:
+    """Append and publish a single message (a batch of one); None without a conversation_id."""
+    appended = await append_messages(conversation_id, [(role, content)])
+    return appended[0] if appended else None
+
+
+async def read_messages(
+    conversation_id: str,
+    after_id: Optional[str] = None,
+    limit: Optional[int] = CHAT_HISTORY_PAGE_SIZE
+) -> List[Dict[str, Any]]:
+    """Messages strictly after `after_id` (from the start when None), oldest first, at most `limit`."""
+    start = f"({after_id}" if after_id else "-"
+    entries = await async_redis_caching().xrange(chat_history_key(conversation_id), min=start, max="+", count=limit)
+    return [_to_message(entry_id, fields) for entry_id, fields in entries]
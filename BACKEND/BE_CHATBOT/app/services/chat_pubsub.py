@@ -0,0 +1,124 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+
+from services.chat_history_cache import CHAT_CHANNEL
+from services.redis_caching import async_redis_pubsub_client
+from utils.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+CHAT_CHANNEL_PATTERN = CHAT_CHANNEL.format(conversation_id="*")
+CHAT_CHANNEL_PREFIX = CHAT_CHANNEL.format(conversation_id="")
+# Messages buffered per subscriber before the oldest are dropped (a slow client must not grow memory)
+SUBSCRIBER_QUEUE_SIZE = 256
+RECONNECT_DELAY_MAX = 30
+# How long one read waits for a message; each read also sends the due health-check PING
+POLL_TIMEOUT = 1.0
+# Put on every subscriber queue after a resubscribe: messages may have been published
+# while the subscription was down, so subscribers re-read the stream from their last id
+RESYNC = object()
+
+
+class ChatFanout:
+    """
+    One Redis pattern subscription per worker, fanned out to in-process queues.
+
+    Every SSE connection registers an asyncio.Queue for its conversation; a single
+    listener task reads `chat:*` from Redis and puts each message on the queues of
+    that conversation. Idle subscribers only wait on their queue, so they hold
+    neither a thread nor a Redis connection.
+
+    Pub/sub has no replay: whenever the subscription is (re-)established, every
+    queue receives RESYNC and its reader catches up from the history stream.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._queues.values())
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen(), name="chat-fanout")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @asynccontextmanager
+    async def subscribe(self, conversation_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Register a queue receiving the raw JSON messages published for the conversation."""
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues.setdefault(conversation_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._queues.get(conversation_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._queues[conversation_id]
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, item, conversation_id: str) -> None:
+        if queue.full():
+            queue.get_nowait()
+            logger.warning(f"Subscriber queue full for conversation {conversation_id}, dropping oldest message")
+        queue.put_nowait(item)
+
+    def dispatch(self, conversation_id: str, data: str) -> None:
+        for queue in self._queues.get(conversation_id, ()):
+            self._put(queue, data, conversation_id)
+
+    def resync(self) -> None:
+        for conversation_id, queues in self._queues.items():
+            for queue in queues:
+                self._put(queue, RESYNC, conversation_id)
+
+    async def _listen(self) -> None:
+        delay = 1
+        while True:
+            pubsub = async_redis_pubsub_client().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(CHAT_CHANNEL_PATTERN)
+                logger.info(f"Chat fan-out subscribed to {CHAT_CHANNEL_PATTERN}")
+                delay = 1
+                # Covers subscribers registered while the subscription was (being) set up
+                self.resync()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=POLL_TIMEOUT)
+                    if message is None or message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode("utf-8")
+                    data = message["data"]
+                    if isinstance(data, bytes):
+                        data = data.decode("utf-8")
+                    self.dispatch(channel[len(CHAT_CHANNEL_PREFIX):], data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat fan-out lost its Redis subscription, retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+chat_fanout = ChatFanout()
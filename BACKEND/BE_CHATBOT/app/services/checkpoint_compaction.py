@@ -0,0 +1,36 @@
+"""
+Offline compaction of the LangGraph checkpoint store.
+
+    cd BACKEND/BE_CHATBOT/app
+    python -m services.checkpoint_compaction --keep-last 5 --dry-run
+"""
+import argparse
+
+from services.mongo_checkpoint import CHECKPOINT_KEEP_LAST, CompactingMongoDBSaver, get_mongo_client
+from utils.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune, recompress and TTL-stamp stored graph checkpoints")
+    parser.add_argument("--keep-last", type=int, default=CHECKPOINT_KEEP_LAST,
+                        help=f"Checkpoints kept per thread (default: {CHECKPOINT_KEEP_LAST}, 0 keeps all)")
+    parser.add_argument("--no-recompress", action="store_true", help="Leave uncompressed blobs as they are")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    client = get_mongo_client()
+    if not client:
+        raise SystemExit("MongoDB is not reachable")
+
+    saver = CompactingMongoDBSaver(client, keep_last=args.keep_last)
+    if not args.dry_run:
+        saver.setup()
+    stats = saver.compact(recompress=not args.no_recompress, dry_run=args.dry_run)
+    logger.info(f"Checkpoint compaction {'(dry run) ' if args.dry_run else ''}finished: {stats}")
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
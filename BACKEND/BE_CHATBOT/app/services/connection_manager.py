@@ -0,0 +1,318 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, Tuple, Type, TypeVar
+
+from pymongo import monitoring
+
+from config.config_loader import CONFIG
+from utils.logging.logger import get_logger
+from utils.utils import get_value_from_dict
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+HEALTH_CHECK_INTERVAL = get_value_from_dict("connection_config.health_check_interval", CONFIG or {}, default=30)()
+FAILURE_THRESHOLD = get_value_from_dict("connection_config.failure_threshold", CONFIG or {}, default=3)()
+RESET_TIMEOUT = get_value_from_dict("connection_config.reset_timeout", CONFIG or {}, default=30)()
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; while open, callers
+    get no client and skip the backend. After `reset_timeout` one caller is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class PoolStats:
+    """Checkout counters and wait times, filled by the pool instrumentation of each backend."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.exhausted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_checkout(self, wait: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def record_failure(self, exhausted: bool = False) -> None:
+        with self._lock:
+            self.checkout_failures += 1
+            self.exhausted += exhausted
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_exhausted": self.exhausted,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+
+class ManagedConnection(Generic[T]):
+    """
+    A lazily created client guarded by a circuit breaker.
+
+    `get()` never touches the network: the driver's own pool reconnects on the
+    next real command, actual failures are reported by the pool instrumentation,
+    and liveness is checked by the background monitor instead of per call.
+    Failures that happen before any pool event (e.g. no server could be selected)
+    are recorded by running commands under `guard()`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[["ManagedConnection[T]"], T],
+        health_check: Callable[[T], Any],
+        pool_metrics: Callable[[T], Dict[str, Any]],
+        failure_errors: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.name = name
+        self.factory = factory
+        self.health_check = health_check
+        self.pool_metrics = pool_metrics
+        self.failure_errors = failure_errors
+        self.breaker = CircuitBreaker()
+        self.stats = PoolStats()
+        self.last_check: Optional[float] = None
+        self.last_check_ms: Optional[float] = None
+        self._client: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Optional[T]:
+        return self._client
+
+    def get(self) -> Optional[T]:
+        if not self.breaker.allow():
+            return None
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        self._client = self.factory(self)
+                    except Exception as e:
+                        logger.error(f"Failed to create {self.name} client: {e}")
+                        self.record_failure()
+                        return None
+        return self._client
+
+    def record_success(self) -> None:
+        if self.breaker.state == CircuitBreaker.CLOSED and not self.breaker.failures:
+            return
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            logger.info(f"{self.name} connection recovered, closing circuit")
+        self.breaker.record_success()
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        was_open = self.breaker.state == CircuitBreaker.OPEN
+        self.breaker.record_failure()
+        if not was_open and self.breaker.state == CircuitBreaker.OPEN:
+            logger.warning(f"{self.name} circuit opened after {self.breaker.failures} failures: {error}")
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Record `failure_errors` raised by the enclosed commands in the circuit breaker, then re-raise."""
+        try:
+            yield
+        except self.failure_errors as e:
+            self.record_failure(e)
+            raise
+
+    def check(self) -> bool:
+        """Run the health check once (used by the monitor)."""
+        client = self._client
+        if client is None:
+            return False
+        started = time.perf_counter()
+        try:
+            self.health_check(client)
+        except Exception as e:
+            self.record_failure(e)
+            return False
+        finally:
+            self.last_check = time.time()
+            self.last_check_ms = round((time.perf_counter() - started) * 1000, 3)
+        self.record_success()
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        pool = {}
+        if self._client is not None:
+            try:
+                pool = self.pool_metrics(self._client)
+            except Exception as e:
+                logger.warning(f"Could not read {self.name} pool metrics: {e}")
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "last_health_check_ms": self.last_check_ms,
+            **pool,
+            **self.stats.snapshot(),
+        }
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener, monitoring.ServerHeartbeatListener):
+    """
+    Feeds pymongo pool events into the connection's stats and circuit breaker.
+    Server heartbeats are watched too: while no server is reachable there are
+    no checkouts at all, only failed heartbeats.
+    """
+
+    def __init__(self, connection: ManagedConnection):
+        self.connection = connection
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self._lock = threading.Lock()
+
+    def in_use(self) -> int:
+        return self.checked_out
+
+    def idle(self) -> int:
+        return self.created - self.closed - self.checked_out
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+        self.connection.stats.record_checkout(event.duration or 0.0)
+        self.connection.record_success()
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event):
+        self.connection.stats.record_failure(exhausted=event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT)
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.CONN_ERROR:
+            self.connection.record_failure(event.reason)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.connection.record_success()
+
+    def failed(self, event):
+        self.connection.record_failure(event.reply)
+
+
+class HealthMonitor:
+    """Daemon thread that health-checks every registered connection each `interval` seconds."""
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL):
+        self.interval = interval
+        self.connections: List[ManagedConnection] = []
+        # Pools that only report metrics (e.g. the asyncio Redis pool, checked by its own commands)
+        self.metric_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def register(self, connection: ManagedConnection) -> ManagedConnection:
+        with self._lock:
+            self.connections.append(connection)
+        return connection
+
+    def register_metrics(self, name: str, source: Callable[[], Dict[str, Any]]) -> None:
+        self.metric_sources[name] = source
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="connection-health", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            for connection in list(self.connections):
+                connection.check()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        metrics = {connection.name: connection.metrics() for connection in self.connections}
+        for name, source in self.metric_sources.items():
+            metrics[name] = source()
+        return metrics
+
+
+health_monitor = HealthMonitor()
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """Pool size, in-use/idle connections, checkout wait times and circuit state per backend."""
+    return health_monitor.metrics()
@@ -2,14 +2,23 @@ import datetime
 import time
 from decimal import Decimal
 from typing import Any, Dict, List, Optional, Callable
-from .snowflake_id import SnowflakeGenerator
+from .snowflake_id import SnowflakeGenerator, get_snowflake_generator
 import boto3
 from boto3.dynamodb.conditions import Key
 from boto3.dynamodb.types import DYNAMODB_CONTEXT
+from botocore.exceptions import ClientError
 
 from utils.logging.logger import get_logger
 
 logger = get_logger(__name__)
+
+# Puts are idempotent on the snowflake id without reading it first
+ID_NOT_EXISTS = "attribute_not_exists(id)"
+# Fields telling a retried write of the same message from another message under a colliding id
+SAME_ITEM_FIELDS = ("conversation_id", "type", "message", "created_at")
+# TransactWriteItems accepts at most 100 actions
+TRANSACTION_MAX_ITEMS = 100
+
 class DynamoHistory:
     def __init__(
         self,
@@ -17,15 +26,18 @@ class DynamoHistory:
         aws_access_key_id: str,
         aws_secret_access_key: str,
         table_name: str = "HISTORY_CONVO",
-        snowflake_generator: Optional[SnowflakeGenerator] = None
+        snowflake_generator: Optional[SnowflakeGenerator] = None,
+        endpoint_url: Optional[str] = None
     ):
         self.region_name = region_name
+        self.endpoint_url = endpoint_url or None
         self.aws_access_key_id = aws_access_key_id
         self.aws_secret_access_key = aws_secret_access_key
         self.table_name = table_name
         self.dynamodb = self.set_dynamodb()
         self.table = self.dynamodb.Table(self.table_name)
-        self.snowflake_gen = snowflake_generator or SnowflakeGenerator(node_id=1)
+        self.snowflake_gen = snowflake_generator or get_snowflake_generator()
+        self._table_exists: Optional[bool] = None
 
     def set_dynamodb(self):
         region = self.region_name
@@ -44,17 +56,23 @@ class DynamoHistory:
             region_name=region,
             aws_access_key_id=access_key,
             aws_secret_access_key=secret_key,
+            endpoint_url=self.endpoint_url,
         )
 
-    def check_table_exists(self) -> bool:
+    def check_table_exists(self, refresh: bool = False) -> bool:
+        """Describe the table once and cache the answer (pass refresh=True to ask DynamoDB again)."""
+        if self._table_exists is not None and not refresh:
+            return self._table_exists
         try:
-            existing_tables = [t.name for t in self.dynamodb.tables.all()]
-            exists = self.table_name in existing_tables
-            print(f"[INFO] Table '{self.table_name}' exists: {exists}")
-            return exists
+            self.table.load()
+            self._table_exists = True
+        except self.dynamodb.meta.client.exceptions.ResourceNotFoundException:
+            self._table_exists = False
         except Exception as e:
             print(f"[ERROR] Failed to check table existence: {str(e)}")
             return False
+        print(f"[INFO] Table '{self.table_name}' exists: {self._table_exists}")
+        return self._table_exists
     def check_id_exists(self, message_id: str) -> bool:
         try:
             response = self.table.get_item(Key={"id": message_id})
@@ -62,7 +80,7 @@ class DynamoHistory:
         except Exception as e:
             print(f"[ERROR] Failed to check ID existence: {str(e)}")
             return False
-    def save_chat_history(
+    def build_history_items(
         self,
         conversation_id: str,
         user_id: str,
@@ -79,11 +97,8 @@ class DynamoHistory:
         language: Optional[str] = None,
         tool_call_name: Optional[str] = None,
         tool_call_type: Optional[str] = None,
-    ) -> Dict[str, Any]:
-
-        if not self.check_table_exists():
-            raise Exception(f"DynamoDB table '{self.table_name}' does not exist.")
-
+    ) -> List[Dict[str, Any]]:
+        """Build the HUMAN-MESSAGE and AI-MESSAGE items of one turn without writing them."""
         now = datetime.datetime.now()
         start_time = start_time or now
         end_time = end_time or now
@@ -128,50 +143,129 @@ class DynamoHistory:
 
         human_id = self.snowflake_gen.generate_snowflake_id(time=start_time)
         ai_id = self.snowflake_gen.generate_snowflake_id(time=end_time)
-        human_exists = self.check_id_exists(str(human_id))
-        ai_exists = self.check_id_exists(str(ai_id))
-        
-        # Always save human message if it doesn't exist
-        if not human_exists:
-            user_item = {
-                "id": human_id,
-                "type": "HUMAN-MESSAGE",
-                "required_form": required_form_value,
-                "message": user_input,
-                **fields,
-            }
-            self.table.put_item(Item=user_item)
-            logger.info(f"Saved human message with ID: {human_id}")
-
-        # Save AI message if it doesn't exist and we have response or tool call
-        if not ai_exists:
-            if response:
-                ai_item = {
-                    "id": ai_id,
-                    "type": "AI-MESSAGE",
-                    "required_form": required_form_value,
-                    "message": response,
-                    **fields,
-                }
-                self.table.put_item(Item=ai_item)
-                logger.info(f"Saved AI response with ID: {ai_id}")
-
-            elif tool_call_name:
-                tool_item = {
-                    "id": ai_id,
-                    "type": "AI-MESSAGE",
-                    "required_form": required_form_value,
-                    "message": f"Tool called: {tool_call_name}",
-                    **fields,
-                }
-                self.table.put_item(Item=tool_item)
-                logger.info(f"Saved AI tool call with ID: {ai_id}")
 
-        if human_exists and ai_exists:
-            logger.info(f"Both human_id and ai_id already exist: {human_id}, {ai_id}")
-            return {"conversation_id": conversation_id, "reply_to_message_id": reply_to_message_id}
+        items = [{
+            "id": human_id,
+            "type": "HUMAN-MESSAGE",
+            "required_form": required_form_value,
+            "message": user_input,
+            **fields,
+        }]
 
-        return {"conversation_id": conversation_id, "reply_to_message_id": reply_to_message_id}
+        # AI message only when there is a response or a tool call
+        if response:
+            items.append({
+                "id": ai_id,
+                "type": "AI-MESSAGE",
+                "required_form": required_form_value,
+                "message": response,
+                **fields,
+            })
+        elif tool_call_name:
+            items.append({
+                "id": ai_id,
+                "type": "AI-MESSAGE",
+                "required_form": required_form_value,
+                "message": f"Tool called: {tool_call_name}",
+                **fields,
+            })
+        return items
+
+    def write_items(self, items: List[Dict[str, Any]], mode: str = "conditional") -> int:
+        """
+        Write history items; returns how many were written.
+
+        - "conditional": one put_item per item with attribute_not_exists(id).
+        - "transaction": conditional puts grouped in TransactWriteItems (one request per
+          100 items, twice the write units). Failed items are resolved as below and
+          the rest is retried.
+        - "batch": batch_writer, 25 puts per request, no idempotency check.
+
+        When the condition fails the stored item is read: the same message is
+        skipped, another one (a snowflake id collision between workers) gets a new
+        id and is written again.
+        """
+        if not self.check_table_exists():
+            raise Exception(f"DynamoDB table '{self.table_name}' does not exist.")
+        if mode == "batch":
+            with self.table.batch_writer(overwrite_by_pkeys=["id"]) as batch:
+                for item in items:
+                    batch.put_item(Item=item)
+            written = len(items)
+        elif mode == "transaction":
+            written = sum(
+                self._transact_put(items[i:i + TRANSACTION_MAX_ITEMS])
+                for i in range(0, len(items), TRANSACTION_MAX_ITEMS)
+            )
+        else:
+            written = sum(self._conditional_put(item) for item in items)
+        logger.info(f"Saved {written}/{len(items)} history items")
+        return written
+
+    def _is_stored(self, item: Dict[str, Any]) -> bool:
+        """Whether the item under item["id"] is this very message (a retried write)."""
+        stored = self.table.get_item(Key={"id": item["id"]}, ConsistentRead=True).get("Item") or {}
+        return all(stored.get(field) == item.get(field) for field in SAME_ITEM_FIELDS)
+
+    def _reminted(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        # Same timestamps as build_history_items, so the new id keeps the message order
+        at = item["updated_at"] if item["type"] == "AI-MESSAGE" else item["created_at"]
+        new_id = self.snowflake_gen.generate_snowflake_id(time=datetime.datetime.fromisoformat(at))
+        logger.warning(f"History id {item['id']} collides with another message, writing it as {new_id}")
+        return {**item, "id": new_id}
+
+    def _conditional_put(self, item: Dict[str, Any]) -> bool:
+        while True:
+            try:
+                self.table.put_item(Item=item, ConditionExpression=ID_NOT_EXISTS)
+                return True
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+            if self._is_stored(item):
+                logger.info(f"History item {item['id']} already exists, skipping")
+                return False
+            item = self._reminted(item)
+
+    def _transact_put(self, items: List[Dict[str, Any]]) -> int:
+        # The resource's client serializes plain Python values itself
+        client = self.dynamodb.meta.client
+        while items:
+            try:
+                client.transact_write_items(TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": self.table_name,
+                            "Item": item,
+                            "ConditionExpression": ID_NOT_EXISTS,
+                        }
+                    }
+                    for item in items
+                ])
+                return len(items)
+            except ClientError as e:
+                reasons = e.response.get("CancellationReasons") or []
+                if e.response["Error"]["Code"] != "TransactionCanceledException" or not reasons:
+                    raise
+                failed = [reason.get("Code") == "ConditionalCheckFailed" for reason in reasons]
+                if not any(failed):
+                    raise
+                remaining = []
+                for item, condition_failed in zip(items, failed):
+                    if not condition_failed:
+                        remaining.append(item)
+                    elif not self._is_stored(item):
+                        remaining.append(self._reminted(item))
+                if len(remaining) < len(items):
+                    logger.info(f"Skipping {len(items) - len(remaining)} history items that already exist")
+                items = remaining
+        return 0
+
+    def save_chat_history(self, conversation_id: str, **kwargs: Any) -> Dict[str, Any]:
+        """Build and write the items of one turn synchronously."""
+        items = self.build_history_items(conversation_id=conversation_id, **kwargs)
+        self.write_items(items)
+        return {"conversation_id": conversation_id, "reply_to_message_id": items[0]["reply_to_message_id"]}
 
     def get_conversation_history(self, conversation_id: str, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         if not conversation_id:
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from services.dynamodb import DynamoHistory
+from utils.concurrency import run_blocking
+from utils.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+HISTORY_QUEUE_SIZE = 1000
+# BatchWriteItem accepts at most 25 items per request
+HISTORY_BATCH_SIZE = 25
+HISTORY_FLUSH_INTERVAL = 0.5
+HISTORY_MAX_RETRIES = 3
+# How long a turn waits for room in a full queue before its record is dropped
+HISTORY_ENQUEUE_TIMEOUT = 5.0
+# One TransactWriteItems request per flushed batch, each put conditional on the id
+# being new: a retried batch cannot duplicate items, at twice the write units of
+# a plain BatchWriteItem ("batch" mode, not idempotent)
+HISTORY_WRITE_MODE = "transaction"
+
+
+class HistoryWriter:
+    """
+    Write-behind queue for DynamoDB chat history.
+
+    Turns hand their items over with `submit` and return immediately; a single
+    background task collects up to HISTORY_BATCH_SIZE items (or whatever arrived
+    within HISTORY_FLUSH_INTERVAL) and writes them in one request with
+    `DynamoHistory.write_items(mode=HISTORY_WRITE_MODE)` in the blocking pool,
+    retrying with exponential backoff. The bounded queue is
+    the backpressure: when DynamoDB falls behind, `submit` waits for room instead
+    of growing memory without limit.
+    """
+
+    def __init__(
+        self,
+        manager: DynamoHistory,
+        queue_size: int = HISTORY_QUEUE_SIZE,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+        max_retries: int = HISTORY_MAX_RETRIES
+    ):
+        self.manager = manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="history-writer")
+
+    async def stop(self) -> None:
+        """Flush what is queued, then stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, **record: Any) -> bool:
+        """Queue the items of one turn (same arguments as `DynamoHistory.save_chat_history`)."""
+        self.start()
+        items = self.manager.build_history_items(**record)
+        try:
+            for item in items:
+                await asyncio.wait_for(self._queue.put(item), timeout=HISTORY_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(f"History queue full, dropping history of conversation {record.get('conversation_id')}")
+            return False
+        return True
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await run_blocking(self.manager.write_items, batch, mode=HISTORY_WRITE_MODE)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(
+                        f"Dropping {len(batch)} history items after {attempt + 1} attempts: {e} | ids={[item['id'] for item in batch]}"
+                    )
+                    return
+                delay = 0.2 * 2 ** attempt
+                logger.warning(f"History write failed (attempt {attempt + 1}), retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
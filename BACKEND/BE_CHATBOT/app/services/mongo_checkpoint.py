@@ -1,47 +1,343 @@
+import datetime
+import zlib
 from config.base_config import APP_CONFIG
+from config.config_loader import CONFIG
+from services.connection_manager import ManagedConnection, MongoPoolListener, health_monitor
+from utils.concurrency import run_blocking
 from utils.logging.logger import get_logger
+from utils.utils import get_value_from_dict
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import WRITES_IDX_MAP, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
 from langgraph.checkpoint.mongodb import MongoDBSaver
-from pymongo import MongoClient
-from typing import Optional
+from langgraph.checkpoint.mongodb.utils import dumps_metadata
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 MONGO_DB_URL = APP_CONFIG.mongo_config.url
 logger = get_logger(__name__)
 
-# Global MongoDB client singleton
-_mongo_client: Optional[MongoClient] = None
+CHECKPOINT_KEEP_LAST = get_value_from_dict("checkpoint_config.keep_last", CONFIG or {}, default=5)()
+CHECKPOINT_TTL_SECONDS = get_value_from_dict("checkpoint_config.ttl_seconds", CONFIG or {}, default=1209600)()
+CHECKPOINT_COMPRESSION = get_value_from_dict("checkpoint_config.compression", CONFIG or {}, default="zstd")()
+CHECKPOINT_COMPRESS_MIN_BYTES = get_value_from_dict("checkpoint_config.compress_min_bytes", CONFIG or {}, default=512)()
+
 _checkpointer: Optional[MongoDBSaver] = None
+_pool_listener: Optional[MongoPoolListener] = None
 
-def get_mongo_client() -> Optional[MongoClient]:
-    """Get or create singleton MongoDB client with connection pooling."""
-    global _mongo_client
-    
-    if _mongo_client is not None:
-        try:
-            # Quick health check
-            _mongo_client.admin.command('ping')
-            return _mongo_client
-        except Exception as e:
-            logger.warning(f"MongoDB connection lost: {e}, attempting to reconnect...")
-            _mongo_client = None
-    
-    try:
-        # Create client with connection pooling
-        _mongo_client = MongoClient(
-            MONGO_DB_URL,
-            maxPoolSize=100,
-            minPoolSize=10,
-            serverSelectionTimeoutMS=5000,
-            connectTimeoutMS=5000,
-            socketTimeoutMS=5000,
-            retryWrites=True,
-            retryReads=True
+
+class ThreadedMongoDBSaver(MongoDBSaver):
+    """
+    MongoDBSaver usable from astream/ainvoke/aget_state.
+
+    The async methods run the synchronous pymongo implementation in the bounded
+    blocking executor, so checkpoint I/O never runs on the event loop and the
+    existing "checkpoints"/"checkpoint_writes" collections keep being used
+    (AsyncMongoDBSaver would need motor and writes to separate *_aio collections).
+    Calls run under mongo_connection.guard(), so an unreachable server opens the circuit.
+    """
+
+    @staticmethod
+    def _guarded(fn, *args, **kwargs):
+        with mongo_connection.guard():
+            return fn(*args, **kwargs)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await run_blocking(self._guarded, self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoints = await run_blocking(
+            self._guarded, lambda: list(self.list(config, filter=filter, before=before, limit=limit))
         )
-        _mongo_client.admin.command('ping')
-        logger.info("MongoDB client initialized with connection pooling")
-        return _mongo_client
-    except Exception as e:
-        logger.error(f"MongoDB connection failed: {str(e)}")
-        return None
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await run_blocking(self._guarded, self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await run_blocking(self._guarded, self.put_writes, config, writes, task_id)
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    Compresses the blobs produced by another serializer.
+
+    The codec is appended to the type tag ("msgpack+zstd"), so blobs written
+    before compression was enabled (plain "msgpack") still load unchanged.
+    """
+
+    def __init__(
+        self,
+        inner: Optional[SerializerProtocol] = None,
+        compression: str = CHECKPOINT_COMPRESSION,
+        min_bytes: int = CHECKPOINT_COMPRESS_MIN_BYTES
+    ):
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, compressing checkpoints with zlib")
+            compression = "zlib"
+        self.inner = inner or JsonPlusSerializer()
+        self.compression = compression
+        self.min_bytes = min_bytes
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.inner.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if self.compression == "none" or len(data) < self.min_bytes:
+            return type_, data
+        if self.compression == "zstd":
+            return f"{type_}+zstd", zstandard.compress(data, 3)
+        return f"{type_}+zlib", zlib.compress(data, 6)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, blob = data
+        if "+" in type_:
+            type_, codec = type_.rsplit("+", 1)
+            if codec == "zstd":
+                if zstandard is None:
+                    raise RuntimeError("zstandard is required to read zstd-compressed checkpoints")
+                blob = zstandard.decompress(blob)
+            elif codec == "zlib":
+                blob = zlib.decompress(blob)
+            else:
+                raise ValueError(f"Unknown checkpoint compression: {codec}")
+        return self.inner.loads_typed((type_, blob))
+
+
+class CompactingMongoDBSaver(ThreadedMongoDBSaver):
+    """
+    Size-bounded checkpointer.
+
+    - blobs are compressed with CompressedSerializer
+    - only the latest `keep_last` checkpoints of a thread (and their pending writes)
+      are kept; older super-steps are deleted right after each put
+    - every document carries `updated_at`, and a TTL index removes threads idle for
+      longer than `ttl_seconds`
+    """
+
+    def __init__(
+        self,
+        client: MongoClient,
+        keep_last: int = CHECKPOINT_KEEP_LAST,
+        ttl_seconds: int = CHECKPOINT_TTL_SECONDS,
+        serde: Optional[SerializerProtocol] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(client, **kwargs)
+        self.serde = serde or CompressedSerializer()
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+
+    def setup(self) -> None:
+        """Create the lookup indexes and the TTL index (idempotent)."""
+        self.checkpoint_collection.create_index(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", DESCENDING)]
+        )
+        self.writes_collection.create_index(
+            [("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("checkpoint_id", ASCENDING),
+             ("task_id", ASCENDING), ("idx", ASCENDING)]
+        )
+        if not self.ttl_seconds:
+            return
+        for collection in (self.checkpoint_collection, self.writes_collection):
+            try:
+                collection.create_index("updated_at", expireAfterSeconds=self.ttl_seconds)
+            except OperationFailure:
+                # The TTL index exists with another expiry: update it in place
+                self.db.command(
+                    "collMod", collection.name,
+                    index={"keyPattern": {"updated_at": 1}, "expireAfterSeconds": self.ttl_seconds}
+                )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_id = checkpoint["id"]
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        doc = {
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "checkpoint": serialized_checkpoint,
+            "metadata": dumps_metadata(metadata),
+            "updated_at": datetime.datetime.now(datetime.timezone.utc),
+        }
+        upsert_query = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+        }
+        self.checkpoint_collection.update_one(upsert_query, {"$set": doc}, upsert=True)
+        self.prune(thread_id, checkpoint_ns)
+        return {"configurable": upsert_query}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Allow replacement on existing writes only if there were errors
+        set_method = "$set" if all(w[0] in WRITES_IDX_MAP for w in writes) else "$setOnInsert"
+        now = datetime.datetime.now(datetime.timezone.utc)
+        operations = []
+        for idx, (channel, value) in enumerate(writes):
+            upsert_query = {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+                "task_id": task_id,
+                "idx": WRITES_IDX_MAP.get(channel, idx),
+            }
+            type_, serialized_value = self.serde.dumps_typed(value)
+            update = {set_method: {"channel": channel, "type": type_, "value": serialized_value}}
+            update.setdefault("$set", {})["updated_at"] = now
+            operations.append(UpdateOne(upsert_query, update, upsert=True))
+        self.writes_collection.bulk_write(operations)
+
+    def prune(self, thread_id: str, checkpoint_ns: str = "", keep_last: Optional[int] = None) -> int:
+        """Delete all but the newest `keep_last` checkpoints of a thread, with their writes."""
+        keep_last = self.keep_last if keep_last is None else keep_last
+        if not keep_last:
+            return 0
+        query = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        stale = [
+            doc["checkpoint_id"]
+            for doc in self.checkpoint_collection.find(
+                query, {"checkpoint_id": 1, "_id": 0}, sort=[("checkpoint_id", -1)], skip=keep_last
+            )
+        ]
+        if not stale:
+            return 0
+        stale_query = {**query, "checkpoint_id": {"$in": stale}}
+        self.checkpoint_collection.delete_many(stale_query)
+        self.writes_collection.delete_many(stale_query)
+        return len(stale)
+
+    def compact(self, keep_last: Optional[int] = None, recompress: bool = True, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Offline compaction of the whole store: prune every thread to `keep_last`
+        checkpoints, drop writes whose checkpoint is gone, re-encode uncompressed
+        blobs and stamp `updated_at` on legacy documents so the TTL index covers them.
+        """
+        keep_last = self.keep_last if keep_last is None else keep_last
+        stats = {"threads": 0, "checkpoints_deleted": 0, "writes_deleted": 0, "blobs_recompressed": 0}
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        threads = self.checkpoint_collection.aggregate([
+            {"$group": {"_id": {"thread_id": "$thread_id", "checkpoint_ns": "$checkpoint_ns"}}}
+        ])
+        for group in threads:
+            query = {"thread_id": group["_id"]["thread_id"], "checkpoint_ns": group["_id"]["checkpoint_ns"]}
+            stats["threads"] += 1
+            ids = [
+                doc["checkpoint_id"]
+                for doc in self.checkpoint_collection.find(query, {"checkpoint_id": 1, "_id": 0}, sort=[("checkpoint_id", -1)])
+            ]
+            kept = ids[:keep_last] if keep_last else ids
+            stats["checkpoints_deleted"] += len(ids) - len(kept)
+            orphan_query = {**query, "checkpoint_id": {"$nin": kept}}
+            stats["writes_deleted"] += self.writes_collection.count_documents(orphan_query)
+            if dry_run:
+                continue
+            if len(kept) < len(ids):
+                self.checkpoint_collection.delete_many({**query, "checkpoint_id": {"$nin": kept}})
+            self.writes_collection.delete_many(orphan_query)
+
+        for collection, field in ((self.checkpoint_collection, "checkpoint"), (self.writes_collection, "value")):
+            if recompress:
+                for doc in collection.find({"type": {"$not": {"$regex": r"\+"}}}, {"type": 1, field: 1}):
+                    type_, blob = self.serde.dumps_typed(self.serde.loads_typed((doc["type"], doc[field])))
+                    if type_ == doc["type"]:
+                        continue
+                    stats["blobs_recompressed"] += 1
+                    if not dry_run:
+                        collection.update_one({"_id": doc["_id"]}, {"$set": {"type": type_, field: blob}})
+            if not dry_run:
+                collection.update_many({"updated_at": {"$exists": False}}, {"$set": {"updated_at": now}})
+        return stats
+
+
+def _create_mongo_client(managed: ManagedConnection) -> MongoClient:
+    # Create client with connection pooling; pool events feed the metrics and the circuit breaker
+    global _pool_listener
+    _pool_listener = MongoPoolListener(managed)
+    client = MongoClient(
+        MONGO_DB_URL,
+        maxPoolSize=100,
+        minPoolSize=10,
+        serverSelectionTimeoutMS=5000,
+        connectTimeoutMS=5000,
+        socketTimeoutMS=5000,
+        retryWrites=True,
+        retryReads=True,
+        event_listeners=[_pool_listener]
+    )
+    logger.info("MongoDB client initialized with connection pooling")
+    return client
+
+
+def _mongo_pool_metrics(client: MongoClient) -> Dict[str, Any]:
+    return {
+        "max_connections": client.options.pool_options.max_pool_size,
+        "in_use": _pool_listener.in_use(),
+        "idle": _pool_listener.idle(),
+    }
+
+
+mongo_connection: ManagedConnection[MongoClient] = health_monitor.register(ManagedConnection(
+    "mongodb",
+    factory=_create_mongo_client,
+    health_check=lambda client: client.admin.command("ping"),
+    pool_metrics=_mongo_pool_metrics,
+    # Raised before any pool event when no server can be selected
+    failure_errors=(ServerSelectionTimeoutError,),
+))
+
+
+def get_mongo_client() -> Optional[MongoClient]:
+    """Get the singleton MongoDB client (no ping; None while the circuit is open)."""
+    return mongo_connection.get()
 
 
 def create_checkpointer() -> Optional[MongoDBSaver]:
@@ -56,9 +352,15 @@ def create_checkpointer() -> Optional[MongoDBSaver]:
         return None
 
     # Create checkpointer directly
-    _checkpointer = MongoDBSaver(client=client)
+    _checkpointer = CompactingMongoDBSaver(client=client)
 
     if hasattr(_checkpointer, "setup"):
-        _checkpointer.setup()
+        try:
+            _checkpointer.setup()
+        except Exception as e:
+            # First real round trip to MongoDB: run without persistence if it is unreachable
+            logger.error(f"MongoDB checkpointer setup failed: {e}")
+            mongo_connection.record_failure(e)
+            _checkpointer = None
 
     return _checkpointer
\ No newline at end of file
@@ -0,0 +1,121 @@
+import json
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from models.database import CustomerInfo
+from services.redis_caching import redis_caching
+from utils.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Users within +/- COHORT_RADIUS years of each other share preferences
+COHORT_RADIUS = 3
+# Safety net for writers that do not go through add_user_to_cohorts (e.g. the AUTH service)
+COHORT_TTL = 3600
+COHORT_KEY = "pref_cohort:{age}"
+
+
+def _merge_preferences(merged: Dict[str, Any], preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """Union list values into sets; scalar values are last-write-wins."""
+    for key, val in preferences.items():
+        if isinstance(val, list):
+            current = merged.get(key)
+            if not isinstance(current, set):
+                current = set(current) if isinstance(current, list) else set()
+                merged[key] = current
+            current.update(val)
+        else:
+            merged[key] = val
+    return merged
+
+
+def _to_document(merged: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: sorted(val) if isinstance(val, set) else val for key, val in merged.items()}
+
+
+def build_cohort_preferences(db: Session, age: int) -> Dict[str, Any]:
+    """Merge the preferences of every customer whose age is within the cohort radius of `age`."""
+    rows = db.query(CustomerInfo.preferences).filter(
+        CustomerInfo.age.between(age - COHORT_RADIUS, age + COHORT_RADIUS),
+        CustomerInfo.preferences.isnot(None)
+    ).all()
+
+    merged: Dict[str, Any] = {}
+    for row in rows:
+        if row[0]:
+            _merge_preferences(merged, json.loads(row[0]))
+    return _to_document(merged)
+
+
+def load_cohort_preferences(db: Session, age: Optional[int]) -> Dict[str, Any]:
+    """
+    Return the pre-merged preference document of the cohort around `age`.
+
+    Reads a single Redis key; on a miss the document is built from SQL once and
+    stored for COHORT_TTL. Falls back to SQL when Redis is unavailable.
+    """
+    if age is None:
+        return {}
+
+    client = redis_caching()
+    key = COHORT_KEY.format(age=age)
+    if client:
+        try:
+            cached = client.get(key)
+            if cached is not None:
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f"Failed to read preference cohort {key}: {e}")
+
+    merged = build_cohort_preferences(db, age)
+    if client:
+        try:
+            client.set(key, json.dumps(merged), ex=COHORT_TTL)
+        except Exception as e:
+            logger.warning(f"Failed to cache preference cohort {key}: {e}")
+    return merged
+
+
+def add_user_to_cohorts(age: Optional[int], preferences: Dict[str, Any]) -> None:
+    """
+    Fold a new customer's preferences into every cached cohort document that covers
+    their age. Documents that are not cached are left alone: they are built from SQL,
+    which already contains the customer, on the next read.
+    """
+    client = redis_caching()
+    if age is None or not preferences or not client:
+        return
+
+    for cohort_age in range(age - COHORT_RADIUS, age + COHORT_RADIUS + 1):
+        key = COHORT_KEY.format(age=cohort_age)
+
+        def _apply(pipe, key=key):
+            cached = pipe.get(key)
+            if cached is None:
+                return
+            merged = _merge_preferences(json.loads(cached), preferences)
+            pipe.multi()
+            pipe.set(key, json.dumps(_to_document(merged)), keepttl=True)
+
+        try:
+            client.transaction(_apply, key)
+        except Exception as e:
+            logger.warning(f"Failed to update preference cohort {key}, dropping it: {e}")
+            invalidate_cohorts(age)
+            return
+
+
+def invalidate_cohorts(age: Optional[int]) -> None:
+    """
+    Drop the cohort documents covering `age` so they are rebuilt from SQL on the next read.
+    Use after a customer's preferences change or are removed, since unions cannot be undone.
+    """
+    client = redis_caching()
+    if age is None or not client:
+        return
+    keys = [COHORT_KEY.format(age=a) for a in range(age - COHORT_RADIUS, age + COHORT_RADIUS + 1)]
+    try:
+        client.delete(*keys)
+    except Exception as e:
+        logger.error(f"Failed to invalidate preference cohorts around age {age}: {e}")
@@ -1,34 +1,102 @@
+import time
 import redis
+import redis.asyncio as aioredis
 from config.base_config import APP_CONFIG
+from services.connection_manager import ManagedConnection, health_monitor
 from utils.logging.logger import get_logger
-from typing import Optional
+from typing import Any, Dict, Optional
 
 logger = get_logger(__name__)
 REDIS_PASS = APP_CONFIG.redis_config.password
 REDIS_HOST = APP_CONFIG.redis_config.host
 
 # Global singleton instance
-_redis_client: Optional[redis.Redis] = None
+_async_redis_client: Optional[aioredis.Redis] = None
+_async_pubsub_client: Optional[aioredis.Redis] = None
+# Idle pub/sub connections are kept alive by PINGs at this interval instead of a read timeout
+PUBSUB_HEALTH_CHECK_INTERVAL = 15
+
+
+class InstrumentedConnectionPool(redis.ConnectionPool):
+    """ConnectionPool reporting checkout time and connection failures to its ManagedConnection."""
+
+    def __init__(self, *args, managed: ManagedConnection, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.managed = managed
+
+    def get_connection(self, command_name: str, *keys, **options):
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            exhausted = self._created_connections >= self.max_connections and not self._available_connections
+            self.managed.stats.record_failure(exhausted=exhausted)
+            if not exhausted:
+                # A full pool is a sizing problem, not an unhealthy server
+                self.managed.record_failure(e)
+            raise
+        self.managed.stats.record_checkout(time.perf_counter() - started)
+        self.managed.record_success()
+        return connection
+
+
+def _create_redis_client(managed: ManagedConnection) -> redis.Redis:
+    # Create connection pool with proper settings
+    pool = InstrumentedConnectionPool(
+        managed=managed,
+        host=REDIS_HOST,
+        port=16594,
+        password=REDIS_PASS,
+        max_connections=50,
+        decode_responses=True,
+        socket_connect_timeout=5,
+        socket_timeout=5,
+        retry_on_timeout=True,
+        health_check_interval=30
+    )
+    logger.info("Redis client created with connection pooling")
+    return redis.Redis(connection_pool=pool)
+
+
+def _redis_pool_metrics(client: redis.Redis) -> Dict[str, Any]:
+    pool = client.connection_pool
+    return {
+        "max_connections": pool.max_connections,
+        "created": pool._created_connections,
+        "in_use": len(pool._in_use_connections),
+        "idle": len(pool._available_connections),
+    }
+
+
+redis_connection: ManagedConnection[redis.Redis] = health_monitor.register(ManagedConnection(
+    "redis",
+    factory=_create_redis_client,
+    health_check=lambda client: client.ping(),
+    pool_metrics=_redis_pool_metrics,
+))
+
 
 def redis_caching() -> Optional[redis.Redis]:
     """
-    Get or create a singleton Redis client with connection pooling.
-    This prevents creating multiple connections and improves performance.
+    Get the singleton Redis client with connection pooling.
+
+    No round trip is made here: the pool reconnects on the next command, and None
+    is returned only while the circuit is open after repeated connection failures,
+    so callers skip the cache instead of waiting on a dead server.
     """
-    global _redis_client
-    
-    if _redis_client is not None:
-        try:
-            # Quick health check
-            _redis_client.ping()
-            return _redis_client
-        except (redis.ConnectionError, redis.TimeoutError):
-            logger.warning("Redis connection lost, attempting to reconnect...")
-            _redis_client = None
-    
-    try:
-        # Create connection pool with proper settings
-        pool = redis.ConnectionPool(
+    return redis_connection.get()
+
+
+def async_redis_caching() -> aioredis.Redis:
+    """
+    Get or create the singleton asyncio Redis client used by the chat endpoints.
+    Connections are opened lazily by the pool, so no ping is issued here; callers
+    handle connection errors on the command itself.
+    """
+    global _async_redis_client
+
+    if _async_redis_client is None:
+        pool = aioredis.ConnectionPool(
             host=REDIS_HOST,
             port=16594,
             password=REDIS_PASS,
@@ -39,17 +107,46 @@ def redis_caching() -> Optional[redis.Redis]:
             retry_on_timeout=True,
             health_check_interval=30
         )
-        
-        _redis_client = redis.Redis(connection_pool=pool)
-        
-        # Test the connection
-        _redis_client.ping()
-        logger.info("Redis connection established successfully with connection pooling")
-        return _redis_client
-        
-    except redis.exceptions.ConnectionError as e:
-        logger.error(f"Redis connection failed: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error connecting to Redis: {e}")
-        return None
\ No newline at end of file
+        _async_redis_client = aioredis.Redis(connection_pool=pool)
+    return _async_redis_client
+
+
+def async_redis_pubsub_client() -> aioredis.Redis:
+    """
+    Dedicated asyncio client for long-lived subscriptions.
+
+    The shared client's socket_timeout would drop an idle subscription every few
+    seconds; here reads may block indefinitely and liveness comes from TCP
+    keepalive plus the PING sent every PUBSUB_HEALTH_CHECK_INTERVAL seconds.
+    """
+    global _async_pubsub_client
+
+    if _async_pubsub_client is None:
+        pool = aioredis.ConnectionPool(
+            host=REDIS_HOST,
+            port=16594,
+            password=REDIS_PASS,
+            max_connections=2,
+            decode_responses=True,
+            socket_connect_timeout=5,
+            socket_timeout=None,
+            socket_keepalive=True,
+            health_check_interval=PUBSUB_HEALTH_CHECK_INTERVAL
+        )
+        _async_pubsub_client = aioredis.Redis(connection_pool=pool)
+    return _async_pubsub_client
+
+
+def _async_redis_pool_metrics() -> Dict[str, Any]:
+    if _async_redis_client is None:
+        return {}
+    pool = _async_redis_client.connection_pool
+    return {
+        "max_connections": pool.max_connections,
+        "in_use": len(pool._in_use_connections),
+        "idle": len(pool._available_connections),
+    }
+
+
+health_monitor.register_metrics("redis_async", _async_redis_pool_metrics)
+
@@ -1,20 +1,69 @@
-import time
 import datetime
-from typing import Optional
+import hashlib
+import os
+import socket
+import threading
+import time
+from typing import List, Optional
+
+from utils.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+NODE_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE_ID = (1 << NODE_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def default_node_id() -> int:
+    """
+    Node id of this process: SNOWFLAKE_NODE_ID, which multi-worker / multi-replica
+    deployments must set to a distinct value per process (one uvicorn worker per
+    container, as in the Dockerfile, each with its own id).
+
+    Without it the id is hashed from the host name and pid. With only 10 bits two
+    processes can draw the same id; DynamoHistory then re-mints the colliding item
+    instead of dropping it, but the setting should be fixed.
+    """
+    configured = os.environ.get("SNOWFLAKE_NODE_ID")
+    if configured:
+        node_id = int(configured)
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"SNOWFLAKE_NODE_ID must be between 0 and {MAX_NODE_ID}, got {node_id}")
+        return node_id
+    identity = f"{socket.gethostname()}:{os.getpid()}".encode()
+    node_id = int.from_bytes(hashlib.blake2b(identity, digest_size=4).digest(), "big") & MAX_NODE_ID
+    logger.warning(
+        f"SNOWFLAKE_NODE_ID is not set; using node id {node_id} hashed from host and pid. "
+        "Set a distinct SNOWFLAKE_NODE_ID per worker when running more than one."
+    )
+    return node_id
+
 
 class SnowflakeGenerator:
     DEFAULT_CUSTOM_EPOCH = 1735664400000
 
-    def __init__(self, node_id: int = 1):
+    def __init__(self, node_id: Optional[int] = None):
+        node_id = default_node_id() if node_id is None else node_id
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"node_id must be between 0 and {MAX_NODE_ID}, got {node_id}")
         self._node_id = node_id
         self._sequence = 0
         self._last_timestamp = -1
         self._epoch = self.DEFAULT_CUSTOM_EPOCH
+        self._lock = threading.Lock()
+
+    @property
+    def node_id(self) -> int:
+        return self._node_id
 
     def _wait_next_millis(self, last_timestamp: int) -> int:
-        timestamp = int(time.time() * 1000)
+        """Sleep (instead of spinning) until the clock passes last_timestamp."""
+        timestamp = self._get_timestamp()
         while timestamp <= last_timestamp:
-            timestamp = int(time.time() * 1000)
+            time.sleep((last_timestamp - timestamp + 1) / 1000)
+            timestamp = self._get_timestamp()
         return timestamp
 
     def _get_timestamp(self, dt: Optional[datetime.datetime] = None) -> int:
@@ -28,33 +77,55 @@ class SnowflakeGenerator:
             if dt.tzinfo is None:
                 dt = dt.replace(tzinfo=datetime.timezone.utc)
             timestamp_ms = int(dt.timestamp() * 1000)
-        
+
         return timestamp_ms - self._epoch
 
-    def generate_snowflake_id(self, time: Optional[datetime.datetime] = None) -> str:
-        """
-        Generate a unique snowflake ID using the given start_time or current time.
-        
-        Args:
-            start_time: Optional datetime to use for timestamp part of ID
-            end_time: Optional datetime (not used in ID generation but provided for API compatibility)
-        
-        Returns:
-            String representation of the snowflake ID
-        """
-        timestamp = self._get_timestamp(time)
-        
+    def _next_id(self, dt: Optional[datetime.datetime]) -> int:
+        # Caller holds self._lock
+        timestamp = self._get_timestamp(dt)
+
         if timestamp < self._last_timestamp:
             timestamp = self._last_timestamp
-            
+
         if timestamp == self._last_timestamp:
-            self._sequence = (self._sequence + 1) & 0xFFF  
+            self._sequence = (self._sequence + 1) & MAX_SEQUENCE
             if self._sequence == 0:
-                timestamp = self._wait_next_millis(self._last_timestamp)
+                # Ids for an explicit (past) time move to the next millisecond; live ids wait for it
+                timestamp = self._wait_next_millis(self._last_timestamp) if dt is None else timestamp + 1
         else:
             self._sequence = 0
-            
+
         self._last_timestamp = timestamp
-        
-        snowflake_id = ((timestamp & 0x1FFFFFFFFFF) << 22) | (self._node_id << 12) | self._sequence
-        return str(snowflake_id)
\ No newline at end of file
+        return ((timestamp & 0x1FFFFFFFFFF) << 22) | (self._node_id << SEQUENCE_BITS) | self._sequence
+
+    def generate_snowflake_id(self, time: Optional[datetime.datetime] = None) -> str:
+        """
+        Generate a unique snowflake ID using the given start_time or current time.
+
+        Args:
+            time: Optional datetime to use for timestamp part of ID
+
+        Returns:
+            String representation of the snowflake ID
+        """
+        with self._lock:
+            return str(self._next_id(time))
+
+    def generate_many(self, n: int, time: Optional[datetime.datetime] = None) -> List[str]:
+        """Generate n increasing ids for the same time under a single lock acquisition."""
+        with self._lock:
+            return [str(self._next_id(time)) for _ in range(n)]
+
+
+_generator: Optional[SnowflakeGenerator] = None
+_generator_lock = threading.Lock()
+
+
+def get_snowflake_generator() -> SnowflakeGenerator:
+    """Process-wide generator; sharing one instance is what keeps ids unique within the process."""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = SnowflakeGenerator()
+    return _generator
@@ -0,0 +1,165 @@
+"""
+Train the fast router's centroid classifier from the chat history logged in DynamoDB.
+
+Each human message is labelled with the route the primary assistant chose for it:
+the handoff or sub-agent tool first called in that turn, or primary_assistant when
+the turn made no new tool call. A holdout split reports how many turns would skip
+the routing LLM call at the configured thresholds and how often that route is right.
+
+    cd BACKEND/BE_CHATBOT/app
+    python -m services.train_fast_router --holdout 0.2
+"""
+import argparse
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from config.base_config import APP_CONFIG
+from orchestrator.appointment_graph.appointment_agent import appointment_tools
+from orchestrator.graph.fast_router import (
+    HANDOFF_ROUTES,
+    MIN_CONFIDENCE,
+    MIN_MARGIN,
+    PRIMARY,
+    ROUTER_MODEL_PATH,
+    CentroidRouter,
+    resolve_model_path,
+)
+from orchestrator.it_graph.it_agent import it_tools
+from orchestrator.shop_graph.shop_agent import shop_tools
+from schemas.device_schemas import CompleteOrEscalate
+from services.dynamodb import DynamoHistory
+from utils.logging.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Replies to a sensitive-tool confirmation resume the graph; they are not routed
+CONFIRMATIONS = {"y", "yes", "n", "no", "có", "không"}
+MIN_EXAMPLES_PER_ROUTE = 20
+
+
+def _tool_name(tool) -> str:
+    return tool.name if hasattr(tool, "name") else tool.__name__
+
+
+def tool_routes() -> Dict[str, str]:
+    """Route of every tool the history can log: handoffs, plus each sub-agent's own tools."""
+    routes = dict(HANDOFF_ROUTES)
+    for tools, route in ((shop_tools, "enter_shop_node"), (it_tools, "enter_it_node"), (appointment_tools, "enter_appointment_node")):
+        routes.update({_tool_name(tool): route for tool in tools})
+    routes[CompleteOrEscalate.__name__] = PRIMARY
+    return routes
+
+
+def scan_human_messages(manager: DynamoHistory, limit: int = 0) -> List[Dict]:
+    items = []
+    kwargs = {
+        "FilterExpression": "#t = :human",
+        "ProjectionExpression": "id, conversation_id, message, tools",
+        "ExpressionAttributeNames": {"#t": "type"},
+        "ExpressionAttributeValues": {":human": "HUMAN-MESSAGE"},
+    }
+    while True:
+        response = manager.table.scan(**kwargs)
+        items.extend(response.get("Items", []))
+        if limit and len(items) >= limit:
+            return items[:limit]
+        if "LastEvaluatedKey" not in response:
+            return items
+        kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+def label_turns(items: List[Dict]) -> Tuple[List[str], List[str]]:
+    """
+    The history stores the last tool call known at the end of each turn, so a turn
+    only counts as routed when its tool call id differs from the previous turn's.
+    """
+    routes = tool_routes()
+    conversations = defaultdict(list)
+    for item in items:
+        conversations[item.get("conversation_id")].append(item)
+
+    texts, labels = [], []
+    for turns in conversations.values():
+        previous_call = None
+        for item in sorted(turns, key=lambda x: int(x["id"])):
+            tool = (item.get("tools") or [None])[0] or {}
+            call_id = tool.get("id")
+            text = (item.get("message") or "").strip()
+            if call_id and call_id != previous_call:
+                label = routes.get(tool.get("name"))
+            else:
+                label = PRIMARY
+            previous_call = call_id or previous_call
+            if label and text and text.lower() not in CONFIRMATIONS:
+                texts.append(text)
+                labels.append(label)
+    return texts, labels
+
+
+def evaluate(router: CentroidRouter, texts: List[str], labels: List[str], min_confidence: float, min_margin: float) -> Dict:
+    scores = router.scores(texts)
+    order = np.sort(scores, axis=1)
+    best = order[:, -1]
+    margin = best - (order[:, -2] if scores.shape[1] > 1 else 0.0)
+    predicted = np.asarray(router.labels)[scores.argmax(axis=1)]
+    fast = (best >= min_confidence) & (margin >= min_margin) & (predicted != PRIMARY)
+    correct = fast & (predicted == np.asarray(labels))
+    return {
+        "turns": len(texts),
+        "fast_routed": int(fast.sum()),
+        "coverage": round(float(fast.mean()), 3) if len(texts) else 0.0,
+        "precision": round(float(correct.sum() / fast.sum()), 3) if fast.any() else None,
+        "accuracy_all": round(float((predicted == np.asarray(labels)).mean()), 3) if len(texts) else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the fast router from logged DynamoDB chat history")
+    parser.add_argument("--out", default=ROUTER_MODEL_PATH, help=f"Model file (default: {ROUTER_MODEL_PATH})")
+    parser.add_argument("--limit", type=int, default=0, help="Read at most this many human messages (0: all)")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of turns kept for evaluation")
+    parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE)
+    parser.add_argument("--min-margin", type=float, default=MIN_MARGIN)
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate only, do not write the model")
+    args = parser.parse_args()
+
+    dynamo_config = APP_CONFIG.dynamo_config
+    table_name = dynamo_config.table_name() if callable(dynamo_config.table_name) else dynamo_config.table_name
+    manager = DynamoHistory(
+        aws_secret_access_key=dynamo_config.aws_secret_access_key,
+        aws_access_key_id=dynamo_config.aws_access_key_id,
+        table_name=table_name,
+        region_name=dynamo_config.region_name,
+        endpoint_url=dynamo_config.endpoint_url,
+    )
+    texts, labels = label_turns(scan_human_messages(manager, args.limit))
+    counts = Counter(labels)
+    print(f"Labelled turns: {dict(counts)}")
+
+    # Routes with too few examples make noisy centroids; leave them to the LLM
+    keep = [i for i, label in enumerate(labels) if counts[label] >= MIN_EXAMPLES_PER_ROUTE]
+    texts = [texts[i] for i in keep]
+    labels = [labels[i] for i in keep]
+    if len(set(labels)) < 2:
+        raise SystemExit("Not enough labelled history to train the fast router")
+
+    if args.holdout > 0:
+        train_texts, test_texts, train_labels, test_labels = train_test_split(
+            texts, labels, test_size=args.holdout, stratify=labels, random_state=7
+        )
+        router = CentroidRouter().fit(train_texts, train_labels)
+        print(f"Holdout: {evaluate(router, test_texts, test_labels, args.min_confidence, args.min_margin)}")
+
+    if not args.dry_run:
+        router = CentroidRouter().fit(texts, labels)
+        out = resolve_model_path(args.out)
+        router.save(str(out))
+        logger.info(f"Fast router model saved to {out} (routes: {router.labels})")
+        print(f"Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
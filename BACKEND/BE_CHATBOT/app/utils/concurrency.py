@@ -0,0 +1,40 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from config.config_loader import CONFIG
+from .utils import get_value_from_dict
+
+T = TypeVar("T")
+
+# Upper bound on threads running blocking work (sync tools, checkpoint I/O, SQL, boto3) per worker
+BLOCKING_POOL_SIZE = get_value_from_dict("runtime_config.blocking_pool_size", CONFIG or {}, default=32)()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """Get the process-wide bounded executor used to keep blocking calls off the event loop."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+    return _executor
+
+
+def install_blocking_executor(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """
+    Make the bounded executor the loop's default, so asyncio.to_thread and LangChain/LangGraph
+    run_in_executor (used for sync nodes and tools under astream/ainvoke) share the same limit.
+    """
+    (loop or asyncio.get_running_loop()).set_default_executor(get_blocking_executor())
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable in the bounded executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_blocking_executor(), functools.partial(func, *args, **kwargs))
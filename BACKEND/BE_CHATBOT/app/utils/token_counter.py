@@ -1,17 +1,84 @@
-from typing import Any, cast
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Set, cast
 
 from langchain_core.messages import (
     AIMessage,
+    BaseMessage,
     HumanMessage,
     SystemMessage,
     ToolMessage,
 )
 import tiktoken
 
+ENCODING_NAME = "o200k_base"
+MESSAGE_TOKEN_CACHE_SIZE = 50_000
+
+_message_tokens: "OrderedDict[str, int]" = OrderedDict()
+_message_tokens_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = ENCODING_NAME) -> tiktoken.Encoding:
+    """Load a tiktoken encoding once per process."""
+    return tiktoken.get_encoding(name)
+
 
 def str_token_counter(text: str) -> int:
-    enc = tiktoken.get_encoding("o200k_base")
-    return len(enc.encode(text))
+    if not isinstance(text, str):
+        text = str(text)
+    return len(get_encoding().encode(text))
+
+
+@lru_cache(maxsize=64)
+def _short_token_counter(text: str) -> int:
+    """Roles and names repeat on every message; count each distinct one once."""
+    return str_token_counter(text)
+
+
+def _message_role(msg: BaseMessage) -> str:
+    if isinstance(msg, HumanMessage):
+        return "user"
+    elif isinstance(msg, AIMessage):
+        return "assistant"
+    elif isinstance(msg, ToolMessage):
+        return "tool"
+    elif isinstance(msg, SystemMessage):
+        return "system"
+    raise ValueError(f"Unsupported messages type {msg.__class__}")
+
+
+def message_token_counter(msg: BaseMessage) -> int:
+    """
+    Tokens contributed by one message (without the 3-token reply priming).
+
+    AIMessages with provider usage_metadata use the reported output_tokens instead
+    of re-tokenizing the content. Counts are memoized by message id, so a message
+    already seen in an earlier turn is never tokenized again.
+    """
+    key = f"{msg.type}:{msg.id}" if getattr(msg, "id", None) else None
+    if key is not None:
+        with _message_tokens_lock:
+            cached = _message_tokens.get(key)
+            if cached is not None:
+                _message_tokens.move_to_end(key)
+                return cached
+
+    tokens_per_message = 3
+    tokens_per_name = 1
+    usage = getattr(msg, "usage_metadata", None) if isinstance(msg, AIMessage) else None
+    content_tokens = usage["output_tokens"] if usage and usage.get("output_tokens") else str_token_counter(cast(str, msg.content))
+    num_tokens = tokens_per_message + _short_token_counter(_message_role(msg)) + content_tokens
+    if hasattr(msg, "name") and msg.name:
+        num_tokens += tokens_per_name + _short_token_counter(cast(str, msg.name))
+
+    if key is not None:
+        with _message_tokens_lock:
+            _message_tokens[key] = num_tokens
+            while len(_message_tokens) > MESSAGE_TOKEN_CACHE_SIZE:
+                _message_tokens.popitem(last=False)
+    return num_tokens
 
 
 # def tiktoken_counter(messages: List[BaseMessage]) -> int: # TODO:
@@ -21,22 +88,34 @@ def tiktoken_counter(messages: Any) -> int:
     For simplicity only supports str Message.contents.
     """
     num_tokens = 3  # every reply is primed with <|start|>assistant<|message|>
-    tokens_per_message = 3
-    tokens_per_name = 1
     for msg in messages:
-        if isinstance(msg, HumanMessage):
-            role = "user"
-        elif isinstance(msg, AIMessage):
-            role = "assistant"
-        elif isinstance(msg, ToolMessage):
-            role = "tool"
-        elif isinstance(msg, SystemMessage):
-            role = "system"
-        else:
-            raise ValueError(f"Unsupported messages type {msg.__class__}")
-        num_tokens += (
-            tokens_per_message + str_token_counter(cast(str, role)) + str_token_counter(cast(str, msg.content))
-        )
-        if hasattr(msg, "name") and msg.name:
-            num_tokens += tokens_per_name + str_token_counter(cast(str, msg.name))
+        num_tokens += message_token_counter(msg)
     return num_tokens
+
+
+class TokenAccountant:
+    """
+    Token accounting for one turn.
+
+    Remembers the ids of the messages that were in the history before the turn, so
+    the prompt tokens of the turn are the tokens of the messages the run appended:
+    the same number as counting the whole history before and after and taking the
+    difference, at the cost of the new messages only.
+    """
+
+    def __init__(self, history_before: Optional[Iterable[BaseMessage]] = None):
+        self._seen_ids: Set[str] = {msg.id for msg in history_before or [] if getattr(msg, "id", None)}
+
+    def new_messages(self, history_after: Optional[Iterable[BaseMessage]]) -> List[BaseMessage]:
+        return [msg for msg in history_after or [] if not getattr(msg, "id", None) or msg.id not in self._seen_ids]
+
+    def prompt_tokens(self, history_after: Optional[Iterable[BaseMessage]]) -> int:
+        return sum(message_token_counter(msg) for msg in self.new_messages(history_after))
+
+    def completion_tokens(self, final_response: str, history_after: Optional[Iterable[BaseMessage]] = None) -> int:
+        """Provider-reported output tokens of the final answer when available, tiktoken otherwise."""
+        for msg in reversed(self.new_messages(history_after)):
+            usage = getattr(msg, "usage_metadata", None) if isinstance(msg, AIMessage) else None
+            if usage and usage.get("output_tokens") and msg.content == final_response:
+                return usage["output_tokens"]
+        return tiktoken_counter([AIMessage(content=final_response)])